@@ -0,0 +1,100 @@
+import multiprocessing
+import time
+
+# Writes documents to a document store in batches whose size follows the store's latency. Weaviate cancels a batch
+# that takes longer than its timeout, and one fixed batch_size is either too small for a quiet store or too big for
+# a busy one (see buildlog.txt). The writer grows the batch while batches come back faster than target_latency and
+# shrinks it when they are slower. A failed batch is retried after a backoff at half the size; a batch that keeps
+# failing is handed back to the caller instead of being dropped.
+
+class AdaptiveWriter:
+
+    def __init__(self, store, index, batch_size=5, target_latency=10.0, min_batch_size=1, max_batch_size=1000,
+                 retries=4, backoff=2.0, sleep=time.sleep, limiter=None, **write_kwargs):
+        self.store = store
+        self.index = index
+        self.batch_size = batch_size
+        self.target_latency = target_latency
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.limiter = limiter
+        self.write_kwargs = write_kwargs
+
+    def adapt(self, latency):
+        # Move towards the size that would have taken target_latency, at most doubling or halving at once
+        ratio = self.target_latency / max(latency, 1e-6)
+        ratio = min(2.0, max(0.5, ratio))
+        self.batch_size = int(min(self.max_batch_size, max(self.min_batch_size, round(self.batch_size * ratio))))
+
+    def write(self, docs):
+        '''
+        Write all docs. Returns a report with the number of documents written, the documents that could not be
+        written, the time taken and the throughput in docs/s.
+        '''
+        written = 0
+        failed = []
+        attempt = 0
+        i = 0
+        tic = time.perf_counter()
+        while i < len(docs):
+            batch = docs[i:i + self.batch_size]
+            if self.limiter is not None:
+                self.limiter.acquire(len(batch))
+            start = time.perf_counter()
+            try:
+                self.store.write_documents(batch, index=self.index, batch_size=len(batch), **self.write_kwargs)
+            except Exception as e:
+                attempt += 1
+                print("Batch of", len(batch), "failed (attempt", str(attempt) + "):", e)
+                if attempt > self.retries:
+                    failed.extend(batch)
+                    i += len(batch)
+                    attempt = 0
+                else:
+                    self.batch_size = max(self.min_batch_size, len(batch) // 2)
+                    self.sleep(self.backoff ** attempt)
+                continue
+            self.adapt(time.perf_counter() - start)
+            written += len(batch)
+            i += len(batch)
+            attempt = 0
+        seconds = time.perf_counter() - tic
+        report = {'written': written, 'failed': failed, 'seconds': seconds,
+                  'docs_per_s': written / seconds if seconds > 0 else 0.0, 'batch_size': self.batch_size}
+        print("Wrote %d docs in %.1fs (%.1f docs/s), %d failed, batch size now %d"
+              % (written, seconds, report['docs_per_s'], len(failed), self.batch_size))
+        return report
+
+
+class WriteLimit:
+    '''
+    Caps the documents per second that all processes sharing this object write to the stores, and counts them.
+    Create it before starting the worker processes, with their multiprocessing context, and hand it to them (e.g.
+    as initializer argument).
+    '''
+
+    def __init__(self, rate=None, mp=multiprocessing):
+        self.rate = rate
+        self.lock = mp.Lock()
+        self.next_free = mp.Value('d', 0.0, lock=False)
+        self.count = mp.Value('q', 0, lock=False)
+
+    def acquire(self, n):
+        '''
+        Wait until n more documents may be written
+        '''
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_free.value)
+            if self.rate:
+                self.next_free.value = start + n / self.rate
+            self.count.value += n
+        if start > now:
+            time.sleep(start - now)
+
+    @property
+    def written(self):
+        return self.count.value
@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+import time
+
+# Checkpoint manifest for bulk builds. Every chunk of a file is identified by (file, chunk size, chunk number) and
+# collects the stages it has completed: 'preprocessed', 'embedded', 'splitdoc' (written to the split document
+# store) and 'document' (written to the document store). A restarted build skips chunks whose writes are done and
+# redoes the rest. Errors are kept per chunk, so failed chunks can be listed and are retried on the next run.
+# For a shard of the daily updater, the chunk number is shards.frame_id of the chunk rather than its position.
+
+stages = ('preprocessed', 'embedded', 'splitdoc', 'document')
+
+class Checkpoint:
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self.con:
+            self.con.execute("CREATE TABLE IF NOT EXISTS stages (file TEXT, chunk_size INTEGER, chunk INTEGER, stage TEXT, at REAL, "
+                             "PRIMARY KEY (file, chunk_size, chunk, stage))")
+            self.con.execute("CREATE TABLE IF NOT EXISTS errors (file TEXT, chunk_size INTEGER, chunk INTEGER, error TEXT, at REAL)")
+
+    def stages(self, key):
+        with self.lock:
+            return {s for (s,) in self.con.execute("SELECT stage FROM stages WHERE file = ? AND chunk_size = ? AND chunk = ?", key)}
+
+    def mark(self, key, stage):
+        with self.lock, self.con:
+            self.con.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?)", tuple(key) + (stage, time.time()))
+
+    def unmark(self, key, stage):
+        with self.lock, self.con:
+            self.con.execute("DELETE FROM stages WHERE file = ? AND chunk_size = ? AND chunk = ? AND stage = ?", tuple(key) + (stage,))
+
+    def fail(self, key, error):
+        with self.lock, self.con:
+            self.con.execute("INSERT INTO errors VALUES (?, ?, ?, ?, ?)", tuple(key) + (str(error), time.time()))
+
+    def finished(self, key, required):
+        return set(required) <= self.stages(key)
+
+    def failed(self, file=None):
+        '''
+        Chunks that ran into an error and have not completed all stages since, with their last error
+        '''
+        with self.lock:
+            errors = {}
+            for f, size, chunk, error, at in self.con.execute("SELECT * FROM errors WHERE ? IS NULL OR file = ? ORDER BY at, rowid", (file, file)):
+                errors[(f, size, chunk)] = error
+            done = {}
+            for f, size, chunk, stage in self.con.execute("SELECT file, chunk_size, chunk, stage FROM stages WHERE ? IS NULL OR file = ?", (file, file)):
+                done.setdefault((f, size, chunk), set()).add(stage)
+        return {key: error for key, error in errors.items() if not set(stages) <= done.get(key, set())}
+
+    def close(self):
+        self.con.close()
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# On-disk cache of passage embeddings, so a rebuild only runs the model for passages it has not seen before.
+# The vectors live in one float32 matrix on disk (vectors.f32) that is memory-mapped and grows in steps; a SQLite
+# index (index.sqlite) maps the hash of (model name, passage text) to a row of that matrix. Rows are written and
+# flushed before their keys are committed, so the index never points at a row that is not on disk.
+#
+# Several processes can use one cache at the same time (the daily updater next to a bulk build): new rows are taken
+# from the row count in the index inside a write transaction, so no two processes write the same row, and a process
+# that finds a row past the end of its map maps the grown file again.
+
+class EmbeddingCache:
+
+    def __init__(self, directory, grow=65536):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, "vectors.f32")
+        self.grow = grow
+        self.lock = threading.Lock()
+        # Transactions are begun explicitly, see put
+        self.con = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=60, isolation_level=None,
+                                   check_same_thread=False)
+        self.con.execute("CREATE TABLE IF NOT EXISTS vectors (key BLOB PRIMARY KEY, row INTEGER)")
+        self.con.execute("CREATE TABLE IF NOT EXISTS info (name TEXT PRIMARY KEY, value INTEGER)")
+        self.dim = None
+        self.matrix = None
+
+    def info(self):
+        # (dim, rows) as committed to the index, by any process
+        info = dict(self.con.execute("SELECT name, value FROM info"))
+        return info.get('dim'), info.get('rows', 0)
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha1((model + "\0" + text).encode("utf-8")).digest()
+
+    def open(self, capacity):
+        # (Re)map the matrix file, growing it to hold at least capacity rows
+        size = capacity * self.dim * 4
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) < size:
+            with open(self.path, "ab") as f:
+                f.truncate(size)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(os.path.getsize(self.path) // (self.dim * 4), self.dim))
+
+    def get(self, model, texts):
+        '''
+        Cached embeddings for texts, in order; None for the texts that are not in the cache
+        '''
+        with self.lock:
+            return self.lookup(model, texts)
+
+    def lookup(self, model, texts):
+        out = [None] * len(texts)
+        if self.dim is None:
+            self.dim = self.info()[0]
+        if self.dim is None or not texts:
+            return out
+        keys = [self.key(model, t) for t in texts]
+        rows = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i+500]
+            query = "SELECT key, row FROM vectors WHERE key IN (%s)" % ",".join("?" * len(part))
+            rows.update(self.con.execute(query, part))
+        if not rows:
+            return out
+        # Another process may have added rows since the matrix was mapped
+        if self.matrix is None or max(rows.values()) >= len(self.matrix):
+            self.open(0)
+        for i, k in enumerate(keys):
+            if k in rows:
+                out[i] = np.array(self.matrix[rows[k]])
+        return out
+
+    def put(self, model, texts, embeddings):
+        '''
+        Add embeddings for texts. Texts that are already cached are skipped.
+        '''
+        with self.lock:
+            self.add(model, texts, embeddings)
+
+    def add(self, model, texts, embeddings):
+        pairs = [(self.key(model, t), np.asarray(e, dtype=np.float32)) for t, e in zip(texts, embeddings) if e is not None]
+        if not pairs:
+            return
+        known = set()
+        keys = [k for k, _ in pairs]
+        for i in range(0, len(keys), 500):
+            part = keys[i:i+500]
+            query = "SELECT key FROM vectors WHERE key IN (%s)" % ",".join("?" * len(part))
+            known.update(k for (k,) in self.con.execute(query, part))
+        new = {}
+        for k, e in pairs:
+            if k not in known:
+                new[k] = e
+        if not new:
+            return
+
+        # BEGIN IMMEDIATE takes the write lock of the index before the row count is read, so the rows written here
+        # are not handed out to another process as well
+        self.con.execute("BEGIN IMMEDIATE")
+        try:
+            dim, rows = self.info()
+            self.dim = dim or len(next(iter(new.values())))
+            needed = rows + len(new)
+            if self.matrix is None or len(self.matrix) < needed:
+                self.open(needed + self.grow)
+
+            entries = []
+            for n, (k, e) in enumerate(new.items(), rows):
+                self.matrix[n] = e
+                entries.append((k, n))
+            self.matrix.flush()
+
+            # A text another process cached in the meantime keeps its row; the row written here stays unused
+            self.con.executemany("INSERT OR IGNORE INTO vectors VALUES (?, ?)", entries)
+            self.con.execute("INSERT OR REPLACE INTO info VALUES ('dim', ?)", (self.dim,))
+            self.con.execute("INSERT OR REPLACE INTO info VALUES ('rows', ?)", (needed,))
+            self.con.execute("COMMIT")
+        except BaseException:
+            self.con.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        self.con.close()
+
+
+class CachedRetriever:
+    '''
+    Wraps an EmbeddingRetriever so that embed_documents only runs the model for passages that are not in the
+    cache, and adds the new embeddings to it. Everything else is passed through to the retriever, so it can be
+    handed to DocumentStore.update_embeddings.
+    '''
+
+    def __init__(self, retriever, cache, model):
+        self.retriever = retriever
+        self.cache = cache
+        self.model = model
+
+    def __getattr__(self, name):
+        return getattr(self.retriever, name)
+
+    def embed_documents(self, docs):
+        texts = [str(doc.content) for doc in docs]
+        embeds = self.cache.get(self.model, texts)
+        missing = [i for i, e in enumerate(embeds) if e is None]
+        if missing:
+            new = self.retriever.embed_documents([docs[i] for i in missing])
+            for i, e in zip(missing, new):
+                embeds[i] = e
+            self.cache.put(self.model, [texts[i] for i in missing], new)
+        return np.array(embeds)
@@ -0,0 +1,151 @@
+import asyncio
+import queue
+import threading
+import time
+
+import httpx
+
+# Downloads case XMLs from the open data API concurrently. One pooled httpx client serves all requests; at most
+# concurrency requests are in flight and at most rate requests are started per second, the listing pages of
+# listing.py included. A request that times out, fails to connect or gets a 429 or 5xx is retried after a growing
+# backoff. The downloads run on an asyncio loop in a background thread and are handed over through a bounded queue,
+# so parsing and indexing in the calling thread overlap with fetching the next cases, and fetching pauses when the
+# consumer falls behind.
+
+content_url = "https://data.rechtspraak.nl/uitspraken/content?id="
+concurrency = 8
+rate = 10 # requests started per second, None for no limit
+retries = 4
+backoff = 2.0 # seconds before the first retry, doubled after every next failure
+timeout = 60 # seconds per request
+queue_size = 64
+
+retry_status = (429, 500, 502, 503, 504)
+
+class RateLimit:
+    '''
+    Spaces the start of requests at least 1/rate seconds apart. One limit can be shared by the fetch loop (wait)
+    and by threads that make requests of their own (wait_blocking).
+    '''
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_free = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # Seconds to wait before the next request may start
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_free)
+            self.next_free = start + self.interval
+        return start - now
+
+    async def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_blocking(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+limit = None
+
+def get_limit():
+    '''
+    The RateLimit all requests to the open data API share, made again when rate was changed
+    '''
+    global limit
+    if limit is None or limit.rate != rate:
+        limit = RateLimit(rate)
+    return limit
+
+async def fetch_one(client, url, semaphore, limit):
+    '''
+    The body of url as bytes and the seconds spent on the requests. Raises the last error once the retries are
+    used up.
+    '''
+    seconds = 0.0
+    for attempt in range(retries + 1):
+        async with semaphore:
+            await limit.wait()
+            tic = time.perf_counter()
+            try:
+                response = await client.get(url)
+                seconds += time.perf_counter() - tic
+                if response.status_code not in retry_status:
+                    response.raise_for_status()
+                    return response.content, seconds
+                error = httpx.HTTPStatusError("Server returned " + str(response.status_code), request=response.request, response=response)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                seconds += time.perf_counter() - tic
+                error = e
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** attempt)
+    raise error
+
+async def fetch_all(ids, put, base_url=None):
+    '''
+    Fetch the case XML for every id and call put((id, content, error, seconds)) for each as it arrives. Exactly
+    one of content and error is None; seconds is the time spent on the requests, retries included. put may block:
+    that holds up the fetching, not the event loop.
+
+    ids may be any iterable, also one that blocks while it downloads (such as a listing.Listing): it is read in a
+    thread, one id at a time, as the workers need them.
+
+    A fixed pool of workers does the fetching, and a worker only takes the next id once put has returned. So at
+    most one finished download per worker waits for put, however far the consumer falls behind.
+    '''
+    base_url = base_url or content_url
+    ids = iter(ids)
+    next_lock = asyncio.Lock()
+    semaphore = asyncio.Semaphore(concurrency)
+    limit = get_limit()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(timeout), follow_redirects=True) as client:
+
+        async def worker():
+            while True:
+                async with next_lock:
+                    id = await asyncio.to_thread(next, ids, None)
+                if id is None:
+                    return
+                tic = time.perf_counter()
+                try:
+                    content, seconds = await fetch_one(client, base_url + id, semaphore, limit)
+                    result = (id, content, None, seconds)
+                except Exception as e:
+                    result = (id, None, e, time.perf_counter() - tic)
+                await asyncio.to_thread(put, result)
+
+        # More workers than connections, so requests waiting out a backoff do not leave connections idle
+        await asyncio.gather(*(worker() for _ in range(2 * concurrency)))
+
+def fetch_cases(ids, base_url=None):
+    '''
+    Yield (id, content, error, seconds) for every id, in the order the downloads finish. The downloads run in a
+    background thread; at most queue_size finished downloads wait in the queue, plus one per fetch_all worker.
+    '''
+    results = queue.Queue(maxsize=queue_size)
+    failure = []
+
+    def run():
+        try:
+            asyncio.run(fetch_all(ids, results.put, base_url))
+        except BaseException as e:
+            failure.append(e)
+        results.put(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        item = results.get()
+        if item is None:
+            break
+        yield item
+    thread.join()
+    if failure:
+        raise failure[0]
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import sqlite3
+
+# Fingerprints of the cases in the stores: per ECLI a hash of the text and a hash of the metadata, as last indexed.
+# The daily updater compares a fetched case with its fingerprint: an unchanged case is skipped, a case of which only
+# the metadata changed gets a meta update, and only a case with a new or changed text is split and embedded again.
+
+# Meta fields that change on every fetch without the case changing
+volatile = ('added', 'issued')
+
+def digest(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+def fingerprint(docs):
+    '''
+    (text hash, meta hash) of the Haystack Documents of one case
+    '''
+    text = digest("\x00".join(str(doc.content) for doc in docs))
+    metas = [{k: v for k, v in doc.meta.items() if k not in volatile} for doc in docs]
+    meta = digest(json.dumps(metas, sort_keys=True, default=str))
+    return text, meta
+
+def change(old, new):
+    '''
+    'new', 'unchanged', 'meta' (only the metadata changed) or 'text'
+    '''
+    if old is None:
+        return 'new'
+    if old == new:
+        return 'unchanged'
+    if old[0] == new[0]:
+        return 'meta'
+    return 'text'
+
+class Fingerprints:
+
+    def __init__(self, path):
+        self.con = sqlite3.connect(path)
+        self.con.execute("CREATE TABLE IF NOT EXISTS cases (ecli TEXT PRIMARY KEY, text_hash TEXT, meta_hash TEXT, at TEXT)")
+
+    def get(self, ecli):
+        row = self.con.execute("SELECT text_hash, meta_hash FROM cases WHERE ecli = ?", (ecli,)).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, entries):
+        # entries: (ecli, (text hash, meta hash), date)
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?)", [(e, fp[0], fp[1], at) for e, fp, at in entries])
+
+    def close(self):
+        self.con.close()
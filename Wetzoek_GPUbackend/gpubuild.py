@@ -8,6 +8,7 @@ from haystack.document_stores import ElasticsearchDocumentStore
 from haystack.document_stores import WeaviateDocumentStore
 
 from haystack.nodes import EmbeddingRetriever
+from haystack.schema import Document
 
 from haystack.utils import launch_es
 import pandas as pd
@@ -20,6 +21,15 @@ import pyrfc3339
 import pytz
 from datetime import date
 import traceback
+import queue
+import threading
+
+from batch_writer import AdaptiveWriter
+from embedding_cache import EmbeddingCache, CachedRetriever
+import checkpoint
+from checkpoint import Checkpoint
+import refmaps
+import shards
 
 MAPPING = {
     # Shared by cases and laws
@@ -96,12 +106,21 @@ doc_index = "document"
 split_doc_index = "splitdoc"
 language = "dutch"
 n_docs = 2000000
-batch_size = 5
+batch_size = 5 # starting batch size for writes to the split document store, adapted as the build runs
+target_latency = 10 # seconds per batch the split document store writes aim for
 doc_dir = Path("~/data")
 split_length = 100
+chunk_size = 250 # number of rows loaded into Haystack at a time
+pipelined = True # prepare the next chunks while the current one is written
+pipeline_depth = 2 # prepared chunks that may wait to be written
 
 embedding_model="jegormeister/bert-base-dutch-cased-snli"
 model_format="sentence_transformers"
+max_seq_len = 512 # passages are truncated to this many tokens before embedding
+embed_batch_size = 32 # passages per embedding batch
+embed_use_gpu = False # pre-embedding runs on CPU; embedding after the writes (pre_embed = False) uses the GPU
+embedding_cache_dir = "~/embedding_cache" # set to None to always run the model
+checkpoint_db = "~/build_checkpoint.sqlite" # set to None to build without checkpoints
 
 
 
@@ -145,31 +164,55 @@ dates = ['2021-10','2021-11','2021-12','2022-01','2022-02','2022-03','2022-1','2
 
 lawfiles = ['20210728+laws_mvp_clean.csv']
 
-def split_dataframe(df, chunk_size = 250): 
+def split_dataframe(df, chunk_size = chunk_size): 
     chunks = list()
     num_chunks = len(df) // chunk_size + 1
     for i in range(num_chunks):
         chunks.append(df[i*chunk_size:(i+1)*chunk_size])
     return chunks
 
-def cases_to_dicts(filename_cases):
+# read_frames is the same function as in haystack_load.py, which is not importable from here; tests/test_read_frames.py
+# checks that the two stay the same
+
+def read_frames(filename, columns, chunksize=None):
     '''
-    Convert CSV of cases to dictionaries, then load them into Haystack
+    Read a case export in chunks, keeping only the given columns. Parquet files are streamed row group by
+    row group, CSV files with chunksize, so only one chunk is in memory at a time. At most n_docs rows are read.
     '''
-    df = pd.read_csv(doc_dir / filename_cases, nrows=n_docs, sep="|")
-    
-    df = df.drop('Unnamed: 0',axis=1)
-    df = df.rename(columns=MAPPING)
+    chunksize = chunksize or chunk_size
+    path = os.path.expanduser(str(doc_dir / filename))
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        names = [c for c in pf.schema_arrow.names if c in columns]
+        left = n_docs
+        for batch in pf.iter_batches(batch_size=chunksize, columns=names):
+            if left <= 0:
+                break
+            df = batch.to_pandas()[:left]
+            left -= len(df)
+            yield df
+    else:
+        yield from pd.read_csv(path, nrows=n_docs, sep="|", usecols=lambda c: c in columns, chunksize=chunksize)
 
-    # Split dataframe into chunks so machine doesn't crash
-    split_df = split_dataframe(df)
-    count = 0
-    for j in split_df:
-        print(count," / ",len(split_df))
-        count += 1
-        load(convert_df(j))
+def cases_to_dicts(filename_cases, ctx=None):
+    '''
+    Convert CSV (or Parquet) of cases to dictionaries, then load them into Haystack
+    '''
+    # Only read the columns that end up in the DocumentStore
+    columns = [c for c in MAPPING if MAPPING[c] in cols_allow]
 
-def laws_to_dicts(filename):
+    # Read the file in chunks so machine doesn't crash
+    def chunks():
+        rows = 0
+        for count, j in enumerate(read_frames(filename_cases, columns)):
+            rows += len(j)
+            print(count," - ",rows," rows read")
+            yield count, j
+
+    load_chunks(filename_cases, chunks(), ctx)
+
+def laws_to_dicts(filename, ctx=None):
     ''' Convert CSV of laws to dictionaries, then load into Haystack
     '''
     df = pd.read_csv(doc_dir / filename, nrows=n_docs, index_col=0)
@@ -180,104 +223,238 @@ def laws_to_dicts(filename):
 
     # Split dataframe into chunks so machine doesn't crash
     split_df = split_dataframe(df)
-    count = 0
-    for j in split_df:
-        print(count," / ",len(split_df))
-        count += 1
-        load(convert_df(j))
+
+    def chunks():
+        for count, j in enumerate(split_df):
+            print(count," / ",len(split_df))
+            yield count, j
+
+    load_chunks(filename, chunks(), ctx)
 
 def convert_df(df):
     '''
-    Convert a dataframe into a list of dictionaries for Haystack.
+    Convert a dataframe into a list of Haystack Documents.
 
     The dataframe must have the following fields:
     --> content
     --> id
 
-    All other fields will go into the document store in 'meta' and must be in the allowlist
+    All other fields will go into the document store in 'meta' and must be in the allowlist.
+    Rows without content are dropped.
 
     '''
-    ret = []
-    df = df
-    df = df.reset_index(drop=True)
-    df = df.fillna(" - ")
     df = df.rename(columns=MAPPING)
+    df = df[df['content'].notna()]
+    df = df.fillna(" - ")
 
     df['added'] = datetime.datetime.today().strftime('%Y-%m-%d')
 
     # Only write to DocumentStore what's in the allowlist
-    df = df[df.columns.intersection(cols_allow)]
-
-    # Add "Empty" columns for the cols_allow columns that are not already included
-
+    meta_cols = [c for c in df.columns if c in cols_allow and c not in ('content', 'id')]
 
-    records = df.to_dict(orient="records")
-    for i, r in enumerate(records):
-        text = r.pop("content")
-        ids = r.pop("id")
+    # Build the Documents straight from the columns
+    contents = df['content'].tolist()
+    ids = df['id'].tolist()
+    values = zip(*[df[c].tolist() for c in meta_cols])
 
+    ret = []
+    for text, id, vals in zip(contents, ids, values):
+        meta = dict(zip(meta_cols, vals))
         # We add the id back in to meta
-        r['code'] = str(ids)
-        if text is not None:
-            ret.append(
-                {"content": text, "id":ids, "meta": r}
-            )
-            
-        else:
-            pass
+        meta['code'] = str(id)
+        ret.append(Document(content=text, id=id, meta=meta))
 
     return ret
 
-def embed():
+class IngestContext:
+    '''
+    The document stores, PreProcessor and EmbeddingRetriever that load() works with. They are created once and
+    kept for the whole run: every chunk goes through the same store clients (and so the same pooled HTTP
+    connections), and the embedding model is loaded from disk once, the first time it is needed.
+    '''
+
+    def __init__(self):
+        print('Loading document stores')
+        self.document_store = ElasticsearchDocumentStore(analyzer=language, index=doc_index, timeout=300)
+
+        if pre_embed is False:
+            self.split_document_store = ElasticsearchDocumentStore(index=split_doc_index,similarity='cosine')
+        else:
+            self.split_document_store = WeaviateDocumentStore(index=split_doc_index,similarity='cosine',timeout_config=(5,120))
+            print('Running with pre-embedding')
+
+        # Set by the multi-year build to share one write rate between processes
+        self.limiter = None
+        self.split_writer = AdaptiveWriter(self.split_document_store, split_doc_index, batch_size=batch_size,
+                                           target_latency=target_latency, duplicate_documents='overwrite')
+
+        self.preprocessor = PreProcessor(split_length=split_length)
+        self._retriever = None
+        self._pre_retriever = None
+        self.cache = EmbeddingCache(embedding_cache_dir) if embedding_cache_dir else None
+        # Truncation changes the embedding of long passages, so max_seq_len is part of the cache key
+        self.cache_model = embedding_model + "@" + str(max_seq_len)
+        self.checkpoint = Checkpoint(os.path.expanduser(checkpoint_db)) if checkpoint_db else None
+
+    def load_retriever(self, use_gpu):
+        print('Loading embedding model')
+        retriever = EmbeddingRetriever(
+        document_store=self.split_document_store,
+        embedding_model=embedding_model,
+        model_format=model_format,
+        max_seq_len=max_seq_len,
+        batch_size=embed_batch_size,
+        use_gpu=use_gpu,
+        )
+        # Make sure the sentence-transformers model itself truncates to max_seq_len as well
+        model = getattr(getattr(retriever, 'embedding_encoder', None), 'embedding_model', None)
+        if hasattr(model, 'max_seq_length'):
+            model.max_seq_length = max_seq_len
+        return retriever
+
+    @property
+    def retriever(self):
+        '''
+        The retriever update_embeddings runs after the writes, on the GPU if there is one
+        '''
+        if self._retriever is None:
+            self._retriever = self.load_retriever(True)
+        return self._retriever
+
+    @property
+    def pre_retriever(self):
+        '''
+        The retriever pre_embedder runs before the writes, on the CPU unless embed_use_gpu is set
+        '''
+        if self._pre_retriever is None:
+            self._pre_retriever = self.load_retriever(embed_use_gpu)
+        return self._pre_retriever
+
+    def cached(self, retriever):
+        '''
+        retriever behind the embedding cache, if there is one
+        '''
+        if self.cache is None:
+            return retriever
+        return CachedRetriever(retriever, self.cache, self.cache_model)
+
+    @property
+    def embedder(self):
+        '''
+        The retriever update_embeddings runs, behind the embedding cache
+        '''
+        return self.cached(self.retriever)
+
+    @property
+    def tokenizer(self):
+        model = getattr(getattr(self.pre_retriever, 'embedding_encoder', None), 'embedding_model', None)
+        return getattr(model, 'tokenizer', None)
+
+context = None
+
+def get_context():
+    '''
+    The IngestContext of this process, created on first use
+    '''
+    global context
+    if context is None:
+        context = IngestContext()
+    return context
+
+def embed(ctx=None):
+    ctx = ctx or get_context()
 
     print("Adding embeddings")
 
     tic = time.perf_counter()
 
-    retriever = EmbeddingRetriever(
-    document_store=split_document_store,
-    embedding_model=embedding_model,
-    model_format=model_format,
-    )
     print("Updating embeddings")
 
-    split_document_store.update_embeddings(retriever,update_existing_embeddings=False)
+    ctx.split_document_store.update_embeddings(ctx.embedder,update_existing_embeddings=False)
 
     toc = time.perf_counter()
     
     print(toc-tic)
 
-def pre_embedder(docs):
+def token_lengths(texts, tokenizer):
+    '''
+    Length of every text in tokens, or in words if there is no tokenizer to count with
+    '''
+    if tokenizer is None:
+        return [len(t.split()) for t in texts]
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False, truncation=False)['input_ids']]
+
+def pre_embedder(docs, ctx=None):
+    '''
+    Embed the split documents before they are written. Passages are sorted by token length and embedded in
+    batches of embed_batch_size passages of similar length, truncated to max_seq_len, so little padding is
+    needed. If a batch fails, its passages are embedded one by one. Raises once all batches are done if a
+    passage still failed, so the chunk is not written with passages that have no embedding.
+    '''
+    ctx = ctx or get_context()
     print('Running the pre-embedding')
-    retriever = EmbeddingRetriever(
-    document_store=split_document_store,
-    embedding_model=embedding_model,
-    model_format=model_format,
-    )
-    embeds = retriever.embed_documents(docs)
-    for doc, emb in zip(docs,embeds):
+    if not docs:
+        return docs
+    tic = time.perf_counter()
+
+    texts = [str(doc.content) for doc in docs]
+
+    # Passages seen before come out of the embedding cache; only the rest goes through the model
+    todo = list(range(len(docs)))
+    if ctx.cache is not None:
+        todo = []
+        for j, emb in enumerate(ctx.cache.get(ctx.cache_model, texts)):
+            if emb is None:
+                todo.append(j)
+            else:
+                docs[j].embedding = emb
+        print(len(docs) - len(todo), "passages from the embedding cache")
+
+    lengths = token_lengths([texts[j] for j in todo], ctx.tokenizer)
+    order = [todo[k] for k in sorted(range(len(todo)), key=lengths.__getitem__)]
+
+    failed = []
+    for i in range(0, len(order), embed_batch_size):
+        batch = [docs[j] for j in order[i:i+embed_batch_size]]
         try:
-            doc.embedding = emb
+            embeds = ctx.pre_retriever.embed_documents(batch)
         except Exception as e:
             print(e)
+            embeds = []
+            for doc in batch:
+                try:
+                    embeds.append(ctx.pre_retriever.embed_documents([doc])[0])
+                except Exception as e:
+                    print(doc.id, e)
+                    embeds.append(None)
+                    failed.append(doc.id)
+        for doc, emb in zip(batch, embeds):
+            doc.embedding = emb
+        if ctx.cache is not None:
+            ctx.cache.put(ctx.cache_model, [texts[j] for j in order[i:i+embed_batch_size]], embeds)
+
+    toc = time.perf_counter()
+    embedded = len(order) - len(failed)
+    print("Embedded %d passages in %.1fs (%.1f passages/s), %d failed" % (embedded, toc-tic, embedded / max(toc-tic, 1e-9), len(failed)))
+    if failed:
+        raise RuntimeError("%d passages could not be embedded: %s" % (len(failed), ", ".join(str(id) for id in failed)))
     return docs
 
-def load(ret):
+def checkpoint_mark(ctx, key, stage):
+    if key is not None and ctx.checkpoint is not None:
+        ctx.checkpoint.mark(key, stage)
+
+def checkpoint_fail(ctx, key, error):
+    if key is not None and ctx.checkpoint is not None:
+        ctx.checkpoint.fail(key, error)
+
+def prepare(ret, ctx=None, key=None):
     '''
-    Load a list of dictionaries in Haystack format into the DocumentStore. 
+    First half of load(): split a list of dictionaries into passages and, with pre_embed, embed them.
+    Returns the dictionaries and the split documents, or None for the split documents if they could not be
+    embedded. key identifies the chunk in the checkpoint manifest.
     '''
-    
-    print('Loading document stores')
-    global document_store
-    global split_document_store
-    
-    document_store = ElasticsearchDocumentStore(analyzer=language, index=doc_index, timeout=300)
-
-    if pre_embed is False:
-        split_document_store = ElasticsearchDocumentStore(index=split_doc_index,similarity='cosine')
-    else:
-        split_document_store = WeaviateDocumentStore(index=split_doc_index,similarity='cosine',timeout_config=(5,120))
-        print('Running with pre-embedding')
+    ctx = ctx or get_context()
 
     dicts = ret
     print("Number of docs before splitting")
@@ -285,68 +462,235 @@ def load(ret):
     print()
 
     # Preprocessing
-    preprocessor = PreProcessor(split_length=split_length)
     tic = time.perf_counter()
 
     print("Preprocessing...")
-    docs = preprocessor.process(documents=dicts)
+    docs = ctx.preprocessor.process(documents=dicts)
     toc = time.perf_counter()
+    checkpoint_mark(ctx, key, 'preprocessed')
 
     print(toc-tic)
 
     print("Number of split docs")
     print(len(docs))
 
-    tic = time.perf_counter()
-    print("Writing to document store...")
-    print(pre_embed)
     if pre_embed == True:
         print('About to run the pre-embedding')
         try:
-            docs = pre_embedder(docs)
+            docs = pre_embedder(docs, ctx)
+            # Split documents written without their embeddings by an earlier run have to be written again
+            if key is not None and ctx.checkpoint is not None and 'embedded' not in ctx.checkpoint.stages(key):
+                ctx.checkpoint.unmark(key, 'splitdoc')
+            checkpoint_mark(ctx, key, 'embedded')
         except Exception as e:
             print(e)
+            checkpoint_fail(ctx, key, e)
+            docs = None
+
+    return dicts, docs
+
+def write(dicts, docs, ctx=None, key=None):
+    '''
+    Second half of load(): write the split documents and the full documents to their stores. Writes the
+    checkpoint manifest already has for this chunk are skipped. With pre_embed, nothing is written unless the
+    chunk was embedded. Returns whether everything was written.
+    '''
+    ctx = ctx or get_context()
+    if docs is None:
+        # The pre-embedding failed: nothing is written, so the error stays the last entry for this chunk in the
+        # manifest and the whole chunk is retried on the next run
+        print("Chunk not written: it was not embedded")
+        return False
+    done = ctx.checkpoint.stages(key) if key is not None and ctx.checkpoint is not None else set()
+    ok = True
+    split_written = 'splitdoc' in done
+
+    tic = time.perf_counter()
+    print("Writing to document store...")
 
     # Write the documents to the DocumentStore. Note: there are two document stores, one for the full documents (for ES search and as database).
     # The other document store is for embedded documents and semantic search
     try:
-        print("Writing split documents")
-        split_document_store.write_documents(docs, index=split_doc_index,duplicate_documents='overwrite',batch_size=batch_size)
-        print("Writing documents")
-        document_store.write_documents(dicts, index=doc_index,duplicate_documents='overwrite')
+        if 'splitdoc' in done:
+            print("Split documents already written")
+        else:
+            print("Writing split documents")
+            report = ctx.split_writer.write(docs)
+            if report['failed']:
+                # The ids go into the manifest, so the failed passages can be looked up after the run
+                error = "%d split documents could not be written: %s" % (len(report['failed']), ", ".join(str(doc.id) for doc in report['failed']))
+                print(error)
+                ok = False
+                checkpoint_fail(ctx, key, error)
+            else:
+                checkpoint_mark(ctx, key, 'splitdoc')
+                split_written = True
+        if 'document' in done:
+            print("Documents already written")
+        else:
+            print("Writing documents")
+            if ctx.limiter is not None:
+                ctx.limiter.acquire(len(dicts))
+            ctx.document_store.write_documents(dicts, index=doc_index,duplicate_documents='overwrite')
+            checkpoint_mark(ctx, key, 'document')
     except Exception as e:
             print(e)
+            checkpoint_fail(ctx, key, e)
+            ok = False
     
     toc = time.perf_counter()
 
     print(toc-tic)
     
-    if pre_embed == False:
-        embed()
+    # Only a chunk whose split documents are all in the store counts as embedded
+    if pre_embed == False and split_written:
+        try:
+            embed(ctx)
+            checkpoint_mark(ctx, key, 'embedded')
+        except Exception as e:
+            print(e)
+            checkpoint_fail(ctx, key, e)
+            ok = False
 
-def main_fetched(filename_cases):
+    return ok
+
+def load(ret, ctx=None, key=None):
+    '''
+    Load a list of dictionaries in Haystack format into the DocumentStore. Returns whether everything was written.
+    '''
+    return write(*prepare(ret, ctx, key), ctx, key)
+
+def update_meta(docs, ctx=None):
+    '''
+    Update only the meta of documents that are already in the stores: the full document and its split documents,
+    found by their 'code'. Nothing is split or embedded again. Returns whether everything was updated; a document
+    without split documents in the store counts as not updated.
+    '''
+    ctx = ctx or get_context()
+    ok = True
+    for doc in docs:
+        try:
+            splits = ctx.split_document_store.get_all_documents(index=split_doc_index, filters={'code': [doc.meta['code']]},
+                                                                return_embedding=False)
+            if not splits:
+                print("No split documents for", doc.meta['code'])
+                ok = False
+                continue
+            ctx.document_store.update_document_meta(doc.id, doc.meta, index=doc_index)
+            for split in splits:
+                ctx.split_document_store.update_document_meta(split.id, doc.meta, index=split_doc_index)
+        except Exception as e:
+            print(e)
+            ok = False
+    return ok
+
+def load_pipelined(chunks, ctx=None):
+    '''
+    Load an iterable of (key, list of dictionaries) pairs, like load() does for one list. A background thread
+    reads, preprocesses and embeds the next chunks while this thread writes the current one, so embedding (CPU)
+    and writing (network) overlap. At most pipeline_depth prepared chunks wait in the queue: when writing falls
+    behind, the producer blocks, so memory stays flat.
+    '''
+    ctx = ctx or get_context()
+    prepared = queue.Queue(maxsize=pipeline_depth)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for key, ret in chunks:
+                item = prepare(ret, ctx, key) + (key,)
+                while not stop.is_set():
+                    try:
+                        prepared.put(item, timeout=1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            prepared.put(done)
+        except BaseException as e:
+            prepared.put(e)
+
+    tic = time.perf_counter()
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = prepared.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            dicts, docs, key = item
+            write(dicts, docs, ctx, key)
+    finally:
+        stop.set()
+    toc = time.perf_counter()
+    print("Loaded in", toc-tic, "seconds")
+
+def load_chunks(filename, chunks, ctx=None):
+    '''
+    Load the numbered dataframe chunks of a file. Chunks that the checkpoint manifest has as finished are
+    skipped, so a restarted build picks up where it stopped and retries the chunks that failed.
+    '''
+    ctx = ctx or get_context()
+
+    def todo():
+        for count, df in chunks:
+            key = (str(filename), chunk_size, count)
+            if ctx.checkpoint is not None and ctx.checkpoint.finished(key, checkpoint.stages):
+                print("Chunk", count, "already loaded")
+                continue
+            yield key, convert_df(df)
+
+    if pipelined:
+        load_pipelined(todo(), ctx)
+    else:
+        for key, ret in todo():
+            load(ret, ctx, key)
+
+    if ctx.checkpoint is not None:
+        for key, error in ctx.checkpoint.failed(str(filename)).items():
+            print("Chunk", key[2], "of", filename, "failed:", error)
+
+def main_fetched(filename_cases, ctx=None):
+    '''
+    Load a file of the daily updater: the shard of a day, read in chunks, or (for older days) the csv file of one case
+    '''
+    ctx = ctx or get_context()
+    if str(filename_cases).endswith(".jsonl"):
+        # A shard chunk is identified by its lines, not by its position: a case appended again would shift the
+        # chunks after it, and could then end up in a chunk that is already marked as loaded
+        frames = ((shards.frame_id(df), df) for df in shards.read_frames(os.path.dirname(str(filename_cases)), chunk_size))
+        size = chunk_size
+    else:
+        # A csv file is loaded as one chunk
+        size = 0
+        frames = [(0, None)]
+
+    for count, df1 in frames:
+        key = (str(filename_cases), size, count)
+        if ctx.checkpoint is not None and ctx.checkpoint.finished(key, checkpoint.stages):
+            print("Chunk", count, "already loaded")
+            continue
+        if df1 is None:
+            df1 = pd.read_csv(filename_cases,sep="|")
+        load_fetched(df1, ctx, key)
+
+def load_fetched(df1, ctx=None, key=None):
 
-    df1 = pd.read_csv(filename_cases,sep="|")
     print(df1)
-    mapper = pd.read_csv("~/Wetzoek_GPUbackend/instanties_map.csv",encoding="utf-8")
-    mapper2 = pd.read_csv("~/Wetzoek_GPUbackend/rechtsgebieden_map.csv",encoding="utf-8")
-    mapper3 = pd.read_csv("~/Wetzoek_GPUbackend/procedure_map.csv",encoding="utf-8")
 
     try: 
         # Map DFs - instanties
 
-        df1 = df1[df1['text'].notna()]
+        df1 = df1[df1['text'].notna() & (df1['text'] != "")]
 
         if len(df1) > 0:
         
-            df1 = df1.merge(mapper,left_on='instantie',right_on='instantie',how='left')
-            df1 = pd.merge(df1,mapper3,how='left',left_on='procedure',right_on='procedure')
-            
-            # Map DFs - rechtsgebieden
-            
-            df1['rechtsgebied'] = df1['rechtsgebied'].astype(str)
-            df1['rechtsgebied'] = df1['rechtsgebied'].map(lambda x: x.lstrip("\['").rstrip("'/]"))
-            df1 = df1.merge(mapper2,left_on='rechtsgebied',right_on='Raw',how='left')
+            # Map DFs - instanties, procedures and rechtsgebieden
+            df1 = refmaps.enrich_frame(df1)
 
             # Add the 'jurisprudentie' column
             df1['Bron'] = 'Jurisprudentie'
@@ -362,7 +706,7 @@ def main_fetched(filename_cases):
             print(df1['titel'])
             print(df1['procedure'])
             try:
-                load(convert_df(df1))
+                load(convert_df(df1), ctx, key)
                 print("Added to Haystack")
                 
             except:
@@ -375,40 +719,70 @@ def main_fetched(filename_cases):
     except Exception as e:
         print(e)
 
-def main(data_in,type_fn='Cases'):
+def main(data_in,type_fn='Cases',ctx=None):
 
     print("Reading file...")
 
+    # One set of store connections and one embedding model for the whole file
+    ctx = ctx or get_context()
+
     if type_fn == 'Cases':
         print('Cases from data loaded')
-        cases_to_dicts(data_in)
+        cases_to_dicts(data_in, ctx)
     if type_fn == 'Update':
         print('Old cases from chronjob')
-        main_fetched(data_in)
+        main_fetched(data_in, ctx)
     if type_fn == 'Laws':
         print('Laws from data')
-        laws_to_dicts(data_in)
+        laws_to_dicts(data_in, ctx)
+
+def update_files(data_dir="../data", start=None, end=None):
+    '''
+    The files the daily updater wrote, one directory per day, for the days from start to end (inclusive, as
+    YYYY-MM-DD). A day has one shard; days from before the shards have one csv file per case.
+    '''
+    files_out = []
+    for i in sorted(next(os.walk(data_dir))[1]):
+        if (start and i < start) or (end and i > end):
+            continue
+        names = next(os.walk(data_dir + "/" + i))[2]
+        if shards.shard_name in names:
+            files_out.append(data_dir + "/" + i + "/" + shards.shard_name)
+            continue
+        for j in sorted(names):
+            if j.endswith(".csv"):
+                files_out.append(data_dir + "/" + i + "/" + j)
+    return files_out
 
 if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Load parsed cases, laws or daily updates into Haystack. "
+                                         "Chunks already in the checkpoint manifest are skipped, so an interrupted build can be rerun.")
+    arg_parser.add_argument("files", nargs="*", help="files to load (default: all files for the type)")
+    arg_parser.add_argument("--type", choices=["Cases", "Laws", "Update"], default="Cases")
+    arg_parser.add_argument("--from", dest="start", help="Update: first day to load (YYYY-MM-DD)")
+    arg_parser.add_argument("--to", dest="end", help="Update: last day to load (YYYY-MM-DD)")
+    args = arg_parser.parse_args()
+
+    if args.files:
+        todo = args.files
+    elif args.type == 'Cases':
+        todo = [i[0:-4] + "b.csv" for i in files]
+    elif args.type == 'Laws':
+        todo = lawfiles
+    else:
+        todo = update_files(start=args.start, end=args.end)
 
     print("Starting!")
-    count = 0
-    count_len = 0
-    for i in files[20:21]:
-        print(i)
-
-        fetchfile = i[0:-4] + "b.csv"
-        main(fetchfile,'Cases')
-        #test = pd.read_csv(doc_dir / fetchfile, nrows=n_docs, sep="|")
-    '''
-    for i in lawfiles:
+    for i in todo:
         print(i)
-        main(i,'Laws')
-    dirs = next(os.walk("../data"))[1]
-    for i in dirs:
-        for j in next(os.walk("../data/" + i))[2]:
-            if j.endswith(".csv"):
-                fetchfile = "../data/" + i + "/" + j
-                print(fetchfile)
-                main(fetchfile,'Update')
-    print("Done")'''
\ No newline at end of file
+        main(i, args.type)
+
+    ctx = get_context()
+    if ctx.checkpoint is not None:
+        failed = ctx.checkpoint.failed()
+        for key, error in failed.items():
+            print("Failed:", key[0], "chunk", key[2], "-", error)
+        print(len(failed), "chunks failed, rerun to retry them")
+    print("Done")
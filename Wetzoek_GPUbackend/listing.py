@@ -0,0 +1,100 @@
+import re
+import time
+import xml.etree.ElementTree as et
+
+import httpx
+
+import fetcher
+
+# Reads the zoeken?modified= listing of a day: an Atom feed with one entry per ECLI. The feed is requested in pages
+# of page_size entries (the API's max and from parameters) and every page is parsed while it downloads, so the
+# ECLIs can be handed to the fetcher before the whole listing is in. The entry ids are taken; the feed's own id is
+# not an ECLI and is skipped.
+
+listing_url = "http://data.rechtspraak.nl/uitspraken/zoeken"
+page_size = 1000
+
+def local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def parse_page(chunks):
+    '''
+    Incrementally parse one page of the feed from an iterable of byte chunks. Yields ('found', number) for the
+    subtitle and ('id', ECLI) for every entry, as soon as they are complete.
+    '''
+    parser = et.XMLPullParser(events=('end',))
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            name = local(elem.tag)
+            if name == 'entry':
+                for child in elem:
+                    if local(child.tag) == 'id':
+                        yield 'id', child.text.strip()
+                        break
+                elem.clear()
+            elif name == 'subtitle':
+                # e.g. "Aantal gevonden ECLI's: 1234"
+                found = re.findall(r'\d+', elem.text or '')
+                yield 'found', int(found[-1]) if found else None
+    parser.close()
+
+class Listing:
+    '''
+    The ECLIs modified on a day, as an iterable that pages through the feed. After iterating, found is the
+    number of cases the feed reported and count the number of ECLIs read.
+    '''
+
+    def __init__(self, day, client=None, url=None):
+        self.day = str(day)
+        self.client = client
+        self.url = url or listing_url
+        self.found = None
+        self.count = 0
+
+    def page(self, client, start):
+        params = {'modified': self.day, 'max': page_size, 'from': start}
+        done = 0
+        for attempt in range(fetcher.retries + 1):
+            # Listing pages count against the same rate as the case downloads
+            fetcher.get_limit().wait_blocking()
+            try:
+                with client.stream("GET", self.url, params=params) as response:
+                    if response.status_code not in fetcher.retry_status:
+                        response.raise_for_status()
+                    else:
+                        raise httpx.HTTPStatusError("Server returned " + str(response.status_code),
+                                                    request=response.request, response=response)
+                    seen = 0
+                    for kind, value in parse_page(response.iter_bytes()):
+                        if kind == 'found':
+                            self.found = value
+                            continue
+                        # After a retry, skip the ids of this page that were handed out before it broke off
+                        seen += 1
+                        if seen > done:
+                            done = seen
+                            yield value
+                return
+            except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as e:
+                retry = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in fetcher.retry_status
+                if attempt == fetcher.retries or not retry:
+                    raise
+            time.sleep(fetcher.backoff * 2 ** attempt)
+
+    def __iter__(self):
+        client = self.client or httpx.Client(timeout=httpx.Timeout(fetcher.timeout), follow_redirects=True)
+        try:
+            start = 0
+            while True:
+                n = 0
+                for ecli in self.page(client, start):
+                    n += 1
+                    self.count += 1
+                    yield ecli
+                if n < page_size:
+                    break
+                start += page_size
+        finally:
+            if self.client is None:
+                client.close()
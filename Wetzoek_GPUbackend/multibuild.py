@@ -0,0 +1,152 @@
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing.managers import BaseManager
+
+import gpubuild
+from batch_writer import WriteLimit
+
+# Builds all yearly case files (and the laws) at once. Files are spread over a pool of worker processes, each with
+# its own store connections and its own IngestContext. The embedding model is loaded once, in a separate server
+# process, and the workers send it their passages. Workers always pre-embed (gpubuild.pre_embed): embedding after
+# the writes would run update_embeddings over the whole shared split document index in every worker, after every
+# chunk. All workers share one limit on the documents per second written to the stores. The checkpoint manifest is
+# shared too, so an interrupted build can be rerun.
+#
+#   python multibuild.py [--workers 4] [--rate 500] [--no-laws] [files ...]
+
+n_workers = 4
+write_rate = None # documents per second written by all workers together, None for no limit
+report_interval = 30 # seconds between progress reports
+
+class EmbeddingService:
+    '''
+    Runs in the server process: the one embedding model (behind the embedding cache) all workers use. Calls from
+    the workers are served one at a time, so the model never runs two batches at once.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.embedder = None
+
+    def embed_documents(self, docs):
+        with self.lock:
+            if self.embedder is None:
+                ctx = gpubuild.get_context()
+                self.embedder = ctx.cached(ctx.pre_retriever)
+            return self.embedder.embed_documents(docs)
+
+service = None
+
+def get_service():
+    global service
+    if service is None:
+        service = EmbeddingService()
+    return service
+
+class EmbeddingManager(BaseManager):
+    pass
+
+EmbeddingManager.register('Embedder', callable=get_service)
+
+class RemoteRetriever:
+    '''
+    Stands in for the EmbeddingRetriever in a worker: embed_documents is run by the embedding server
+    '''
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+
+    def embed_documents(self, docs):
+        return self.embedder.embed_documents(docs)
+
+def init_server():
+    gpubuild.pre_embed = True
+
+def init_worker(address, authkey, limiter):
+    gpubuild.pre_embed = True
+    manager = EmbeddingManager(address=address, authkey=authkey)
+    manager.connect()
+    # The server keeps the embedding cache, so workers do not write to it at the same time
+    gpubuild.embedding_cache_dir = None
+    ctx = gpubuild.get_context()
+    ctx._pre_retriever = RemoteRetriever(manager.Embedder())
+    ctx.limiter = limiter
+    ctx.split_writer.limiter = limiter
+
+def build_file(filename, type_fn):
+    '''
+    Load one file in a worker. Returns the file, the seconds it took and the number of chunks that failed.
+    '''
+    tic = time.perf_counter()
+    gpubuild.main(filename, type_fn)
+    ctx = gpubuild.get_context()
+    failed = len(ctx.checkpoint.failed(str(filename))) if ctx.checkpoint is not None else 0
+    return filename, time.perf_counter() - tic, failed
+
+def jobs(files, laws=True):
+    '''
+    (file, type) pairs to build, biggest files first so one big year does not end up last
+    '''
+    todo = [(f, 'Cases') for f in files]
+    if laws:
+        todo += [(f, 'Laws') for f in gpubuild.lawfiles]
+    def size(job):
+        path = os.path.expanduser(str(gpubuild.doc_dir / job[0]))
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    return sorted(todo, key=size, reverse=True)
+
+def report(done, total, limiter, tic):
+    seconds = time.perf_counter() - tic
+    print("[multibuild] %d/%d files done, %d docs written in %.0fs (%.1f docs/s)"
+          % (done, total, limiter.written, seconds, limiter.written / seconds if seconds > 0 else 0.0))
+
+def build_all(todo, workers=None, rate=None):
+    '''
+    Build the (file, type) pairs in todo on a pool of worker processes. Returns the failed chunks per file.
+    '''
+    workers = workers or n_workers
+    mp = multiprocessing.get_context('spawn')
+    limiter = WriteLimit(rate, mp)
+    authkey = os.urandom(32)
+    manager = EmbeddingManager(authkey=authkey, ctx=mp)
+    manager.start(init_server)
+    failed = {}
+    tic = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp, initializer=init_worker,
+                                 initargs=(manager.address, authkey, limiter)) as executor:
+            pending = {executor.submit(build_file, f, t): f for f, t in todo}
+            while pending:
+                finished, _ = wait(pending, timeout=report_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    f = pending.pop(future)
+                    try:
+                        f, seconds, n_failed = future.result()
+                        print("[multibuild]", f, "done in %.0fs," % seconds, n_failed, "chunks failed")
+                        if n_failed:
+                            failed[f] = n_failed
+                    except Exception as e:
+                        print("[multibuild]", f, "failed:", e)
+                        failed[f] = e
+                report(len(todo) - len(pending), len(todo), limiter, tic)
+    finally:
+        manager.shutdown()
+    return failed
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load all yearly case files and the laws into Haystack in parallel.")
+    arg_parser.add_argument("files", nargs="*", help="case files to load (default: all years)")
+    arg_parser.add_argument("--workers", type=int, default=n_workers)
+    arg_parser.add_argument("--rate", type=float, default=write_rate, help="documents per second over all workers")
+    arg_parser.add_argument("--no-laws", action="store_true", help="do not load the laws")
+    args = arg_parser.parse_args()
+
+    files = args.files or [i[0:-4] + "b.csv" for i in gpubuild.files]
+    failed = build_all(jobs(files, laws=not args.no_laws), args.workers, args.rate)
+    for f, error in failed.items():
+        print("Failed:", f, "-", error)
+    print("Done")
@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+
+# The reference tables that add readable categories to a case: instanties_map (court), procedure_map and
+# rechtsgebieden_map (area of law). Each table is compiled once into dicts from key to the row's other columns and
+# kept until its file changes on disk, so enriching a case is a few dict lookups instead of three DataFrame merges.
+# The result is the same as the left merges in update_build and gpubuild did: the table's columns are added, with
+# NaN where the key is not in the table. A key that occurs twice in a table keeps its first row.
+
+map_dir = "~/Wetzoek_GPUbackend"
+
+# name: (file, column of the case, column of the table, keep the table's key column)
+maps = {
+    'instanties': ("instanties_map.csv", 'instantie', 'instantie', False),
+    'procedure': ("procedure_map.csv", 'procedure', 'procedure', False),
+    'rechtsgebieden': ("rechtsgebieden_map.csv", 'rechtsgebied', 'Raw', True),
+}
+
+class RefMap:
+    '''
+    One reference table: columns lists the columns it adds, lookup maps a key to the values of those columns
+    '''
+
+    def __init__(self, path, key, keep_key=False):
+        df = pd.read_csv(path, encoding="utf-8")
+        df = df.drop_duplicates(subset=key, keep='first')
+        self.columns = [c for c in df.columns if keep_key or c != key]
+        self.by_column = {c: dict(zip(df[key], df[c])) for c in self.columns}
+        self.lookup = {k: {c: self.by_column[c][k] for c in self.columns} for k in df[key]}
+        self.missing = dict.fromkeys(self.columns, float('nan'))
+
+    def get(self, key):
+        return self.lookup.get(key, self.missing)
+
+compiled = {}
+
+def get_map(name):
+    '''
+    The compiled table, reloaded when the file's mtime has changed
+    '''
+    filename, _, key, keep_key = maps[name]
+    path = os.path.join(os.path.expanduser(map_dir), filename)
+    mtime = os.path.getmtime(path)
+    if name not in compiled or compiled[name][0] != mtime:
+        compiled[name] = (mtime, RefMap(path, key, keep_key))
+    return compiled[name][1]
+
+def rechtsgebied_key(value):
+    # A case's rechtsgebied is a list, or its string form when read back from CSV
+    return str(value).lstrip("\\['").rstrip("'/]")
+
+def enrich(record):
+    '''
+    Add the reference columns to one case (a dict), in place. The rechtsgebied is replaced by its cleaned form.
+    '''
+    record['rechtsgebied'] = rechtsgebied_key(record.get('rechtsgebied'))
+    for name, (_, column, _, _) in maps.items():
+        record.update(get_map(name).get(record.get(column)))
+    return record
+
+def enrich_frame(df):
+    '''
+    Add the reference columns to a DataFrame of cases. The rechtsgebied column is replaced by its cleaned form.
+    '''
+    df = df.copy()
+    df['rechtsgebied'] = df['rechtsgebied'].map(rechtsgebied_key)
+    for name, (_, column, _, _) in maps.items():
+        refmap = get_map(name)
+        for c in refmap.columns:
+            df[c] = df[column].map(refmap.by_column[c])
+    return df
@@ -0,0 +1,122 @@
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Run log of the daily updater: one JSON object per line. Every case gets one record with its ECLI, the seconds
+# spent in each stage (fetch, parse, enrich, save, index), its outcome, the notes logged along the way and, if it
+# failed, the traceback. Other events (such as the start of a day) are records with an 'event' field. Lines are
+# buffered and written every flush_lines records or flush_seconds seconds, and at exit.
+#
+#   python runlog.py <run directory or log file> ...   prints the outcomes and the stage latency percentiles
+
+log_name = "log.jsonl"
+
+class RunLog:
+
+    def __init__(self, path, flush_lines=200, flush_seconds=10):
+        self.path = path
+        self.flush_lines = flush_lines
+        self.flush_seconds = flush_seconds
+        self.records = {}
+        self.buffer = []
+        self.flushed = time.monotonic()
+        atexit.register(self.close)
+
+    def start(self, ecli, **fields):
+        self.records[ecli] = dict({'ecli': ecli, 'at': time.time(), 'stages': {}, 'notes': []}, **fields)
+        return self.records[ecli]
+
+    def record(self, ecli):
+        if ecli not in self.records:
+            self.start(ecli)
+        return self.records[ecli]
+
+    def add_time(self, ecli, stage, seconds):
+        stages = self.record(ecli)['stages']
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, ecli, stage):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(ecli, stage, time.perf_counter() - tic)
+
+    def note(self, ecli, text):
+        self.record(ecli)['notes'].append(text)
+
+    def finish(self, ecli, outcome, error=None):
+        '''
+        Write the case's record with its outcome and, if given, the traceback
+        '''
+        record = self.record(ecli)
+        del self.records[ecli]
+        record['outcome'] = outcome
+        if error is not None:
+            record['traceback'] = error
+        self.write(record)
+
+    def event(self, event, **fields):
+        self.write(dict({'event': event, 'at': time.time()}, **fields))
+
+    def write(self, record):
+        self.buffer.append(json.dumps(record, default=str))
+        if len(self.buffer) >= self.flush_lines or time.monotonic() - self.flushed >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+        self.flushed = time.monotonic()
+
+    def close(self):
+        # Cases still open (e.g. queued for indexing when the run stopped) are written as unfinished
+        for ecli in list(self.records):
+            self.finish(ecli, 'unfinished')
+        self.flush()
+        atexit.unregister(self.close)
+
+def read(paths):
+    '''
+    The records of the log files in paths; a directory stands for its log file
+    '''
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, log_name)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def percentile(values, p):
+    # Nearest rank on sorted values
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+def summarize(paths):
+    outcomes = {}
+    stages = {}
+    for record in read(paths):
+        if 'ecli' not in record:
+            continue
+        outcomes[record.get('outcome')] = outcomes.get(record.get('outcome'), 0) + 1
+        for stage, seconds in record['stages'].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    print("cases:", sum(outcomes.values()))
+    for outcome, n in sorted(outcomes.items(), key=lambda x: -x[1]):
+        print("  %-20s %d" % (outcome, n))
+    print()
+    print("%-8s %7s %9s %9s %9s %9s" % ("stage", "n", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    for stage, values in stages.items():
+        values.sort()
+        print("%-8s %7d %9.1f %9.1f %9.1f %9.1f" % (stage, len(values), 1000 * percentile(values, 50),
+              1000 * percentile(values, 90), 1000 * percentile(values, 99), 1000 * values[-1]))
+
+if __name__ == "__main__":
+    summarize(sys.argv[1:])
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+
+# The daily updater keeps the cases of a day in one append-only JSON-lines shard, data/<date>/cases.jsonl, with
+# one case per line. Next to it, cases.idx lists the ECLI, byte offset and length of every line, so one case can be
+# read with a single seek. Re-indexing a range of days reads the shards front to back. A case that was appended
+# twice on the same day is read in its last version.
+#
+#   python shards.py <day directory> <ECLI>   prints one case
+
+shard_name = "cases.jsonl"
+index_name = "cases.idx"
+
+class ShardWriter:
+    '''
+    Appends cases (dicts with an 'id') to the shard of a directory. The index lines are written after the shard
+    itself is flushed, so the index never points past the data on disk.
+    '''
+
+    def __init__(self, directory, flush_every=100):
+        self.path = os.path.join(directory, shard_name)
+        self.shard = open(self.path, "ab")
+        self.index = open(os.path.join(directory, index_name), "a", encoding="utf-8")
+        self.offset = self.shard.seek(0, os.SEEK_END)
+        self.flush_every = flush_every
+        self.pending = []
+
+    def append(self, record):
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        self.shard.write(line)
+        self.pending.append("%s\t%d\t%d\n" % (record['id'], self.offset, len(line)))
+        self.offset += len(line)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.shard.flush()
+        self.index.write("".join(self.pending))
+        self.index.flush()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.shard.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_index(directory):
+    '''
+    ECLI -> (offset, length) of its last line in the shard
+    '''
+    index = {}
+    path = os.path.join(directory, index_name)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                ecli, offset, length = line.rstrip("\n").split("\t")
+                index[ecli] = (int(offset), int(length))
+    return index
+
+def rebuild_index(directory):
+    '''
+    Write the index again from the shard, e.g. after a run stopped between writing a case and its index line
+    '''
+    with open(os.path.join(directory, shard_name), "rb") as shard, open(os.path.join(directory, index_name), "w", encoding="utf-8") as index:
+        offset = 0
+        for line in shard:
+            index.write("%s\t%d\t%d\n" % (json.loads(line)['id'], offset, len(line)))
+            offset += len(line)
+
+def read_case(directory, ecli, index=None):
+    '''
+    One case from the shard, or None if it is not in the index
+    '''
+    index = index if index is not None else load_index(directory)
+    if ecli not in index:
+        return None
+    offset, length = index[ecli]
+    with open(os.path.join(directory, shard_name), "rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+def read_lines(directory):
+    '''
+    (byte offset, case) for all cases of the shard in one sequential read. Of a case that was appended more than
+    once, only the line the index points to is kept; lines the index does not know yet are kept too.
+    '''
+    index = load_index(directory)
+    latest = {offset for offset, _ in index.values()}
+    offset = 0
+    with open(os.path.join(directory, shard_name), "rb") as f:
+        for line in f:
+            if offset in latest:
+                yield offset, json.loads(line)
+            else:
+                record = json.loads(line)
+                if record['id'] not in index:
+                    yield offset, record
+            offset += len(line)
+
+def read_records(directory):
+    '''
+    All cases of the shard, as read_lines reads them
+    '''
+    for _, record in read_lines(directory):
+        yield record
+
+def read_frames(directory, chunksize):
+    '''
+    The cases of the shard as DataFrames of at most chunksize rows, with lists as strings, the way they came back
+    from the per-case CSV files. The rows are indexed by the byte offset of their line in the shard.
+    '''
+    rows = []
+    offsets = []
+    for offset, record in read_lines(directory):
+        rows.append({k: str(v) if isinstance(v, list) else v for k, v in record.items()})
+        offsets.append(offset)
+        if len(rows) >= chunksize:
+            yield pd.DataFrame(rows, index=offsets)
+            rows = []
+            offsets = []
+    if rows:
+        yield pd.DataFrame(rows, index=offsets)
+
+def frame_id(df):
+    '''
+    A number that identifies a frame of read_frames by the lines it holds. Appending a case again moves it to a
+    new line, so every frame whose lines change gets a new id, wherever it is in the shard.
+    '''
+    return int(hashlib.sha1(",".join(map(str, df.index)).encode("utf-8")).hexdigest()[:15], 16)
+
+if __name__ == "__main__":
+    print(json.dumps(read_case(sys.argv[1], sys.argv[2]), ensure_ascii=False, indent=1))
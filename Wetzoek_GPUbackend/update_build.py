@@ -2,19 +2,24 @@ import pandas as pd
 import xml.etree.ElementTree as et
 import os
 import io
-import re
-import requests
 from datetime import timedelta, date
-from bs4 import BeautifulSoup
 from pathlib import Path
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+import fetcher
+import fingerprints
+import listing
+import refmaps
+import runlog
+import shards
+
 # The purpose of this script is to do the following:
 # 1. From a series of open data XMLs provided by the Dutch government, fetch the legal cases, the result, and metadata
 # -. The result should be a large *list* of *dictionaries* (with lists and dicts embedded) with metadata and text
 # 2. This data will be added to the ElasticSearch instance
-# 3. The output appends to a number of CSV files the key data captured from the open data
+# 3. The output appends the key data captured from the open data to one shard per day (data/<date>/cases.jsonl)
 
 ### SETUP ###
 
@@ -71,9 +76,9 @@ meta_1 = ('identifier',
 )
 
 # %%
-# PARSE function parses the XML file
+# PARSE_XML function parses the text of a case XML
 
-def parse(doc):
+def parse_xml(content):
     meta={'identifier':'',
         'issued':'',
         'publisher':'',
@@ -95,8 +100,7 @@ def parse(doc):
          }
     text={}
 
-    xroot = et.fromstring(requests.get(doc).text)
-    print(doc)
+    xroot = et.fromstring(content)
 
     print("-Start parsing")
     print("--Meta information")
@@ -161,41 +165,37 @@ def parse(doc):
     meta['filesize'] = len(text['tekst'])
 
     return(meta,text)
-    
 
 # PARSE function parses the XML file
 
 
 # %%
-def appendcsv(df_in,id_in):
-    print("-Appending to CSV")
+# The cases of a day are saved in one shard, see shards.py
 
-    # create path to append the CSV
+shard = None
 
-    id_out = re.sub(":","_",str(id_in))
+def appendshard(record):
+    print("-Appending to shard")
+    shard.append(record)
+    errlog("- saved to shard")
 
-    location = id_out + ".csv"
-
-    csv_location = os.path.join(final_directory,location)
-
-    if not os.path.isfile(csv_location):
-        df_in.to_csv(csv_location, mode='a+', header=True, encoding="utf-8",sep='|',index=False)
-    else:
-        df_in.to_csv(csv_location, mode='a', header=False, encoding="utf-8",sep='|',index=False)
 
-    errlog("- saved csv")
+# %%
+# The run log of the day (log.jsonl in final_directory) and the ECLI of the case being worked on
 
+log = None
+current = None
 
-# %%
 def errlog(errtext):
-    errtext = "\n" + errtext
-    o = os.path.join(final_directory, "log.txt")
-    file = open(o, "a+")
-    file.write(errtext)
-    file.close()
+    # Notes go on the record of the current case, or are logged as an event of their own between cases
+    if current is not None:
+        log.note(current, errtext)
+    else:
+        log.event('note', text=errtext)
 
 # %%
-def work_dicts(dicts):
+def work_dicts(dicts, ecli=None):
+    ecli = ecli or dicts[0]['identifier']
     
     # Create DFs
     df1_dict = {}
@@ -212,32 +212,32 @@ def work_dicts(dicts):
     df_out['text'] = df2['tekst'].to_numpy()
 
     try:
-        appendcsv(df_out,dicts[0]['identifier'])
-        print("Saved CSV file")
+        with log.stage(ecli, 'save'):
+            # Same columns as df_out
+            record = {'id': dicts[0]['identifier']}
+            record.update((k, v) for k, v in dicts[0].items() if k != 'identifier')
+            record['text'] = dicts[1]['tekst']
+            appendshard(record)
+        print("Saved to shard")
     
     except:
-        errlog("- Error saving CSV:")
+        errlog("- Error saving to shard:")
         e = traceback.format_exc()
         errlog(e)
-        print("Error saving CSV")
+        current_day.failed.add(ecli)
+        print("Error saving to shard")
 
     # prepare the DF to index
 
     if df_out.loc[df_out.index[0],'text'] == "":
-        errlog("- No text, not indexing")
+        log.finish(ecli, 'no text')
         print("No text, not indexing.")
     else: 
+        tic = time.perf_counter()
         try: 
-            # Map DFs - instanties
-            
-            df1 = df1.merge(mapper,left_on='instantie',right_on='instantie',how='left')
-            df1 = pd.merge(df1,mapper3,how='left',left_on='procedure',right_on='procedure')
-            
-            # Map DFs - rechtsgebieden
+            # Map instanties, procedures and rechtsgebieden on the case itself, then make the one-row DF
             
-            df1['rechtsgebied'] = df1['rechtsgebied'].astype(str)
-            df1['rechtsgebied'] = df1['rechtsgebied'].map(lambda x: x.lstrip("\['").rstrip("'/]"))
-            df1 = df1.merge(mapper2,left_on='rechtsgebied',right_on='Raw',how='left')
+            df1 = pd.DataFrame([refmaps.enrich(df1.iloc[0].to_dict())])
 
             # Add the 'jurisprudentie' column
             df1['Bron'] = 'Jurisprudentie'
@@ -264,78 +264,307 @@ def work_dicts(dicts):
             e = traceback.format_exc()
             errlog(e)
             print("Error preparing indexing doc - written to log")
+        log.add_time(ecli, 'enrich', time.perf_counter() - tic)
 
         try:
-            from gpubuild import load, convert_df
+            from gpubuild import convert_df, update_meta
             print(df1)
-            print("Indexing")
-            load(convert_df(df1))
-            errlog("- Added to Haystack")
+            docs = convert_df(df1)
+
+            # Compare with what was indexed before
+            fp = fingerprints.fingerprint(docs)
+            kind = fingerprints.change(get_prints().get(ecli), fp) if use_fingerprints else 'text'
+            log.record(ecli)['change'] = kind
+            if kind == 'unchanged':
+                log.finish(ecli, 'unchanged')
+                print("Unchanged, not indexing")
+                return
+            if kind == 'meta':
+                with log.stage(ecli, 'update'):
+                    updated = update_meta(docs)
+                if updated:
+                    get_prints().put([(ecli, fp, fetch_date)])
+                    log.finish(ecli, 'meta updated')
+                    print("Updated the meta")
+                    return
+                print("Meta update failed, indexing")
+            print("Queued for indexing")
+            index_case(ecli, docs, fp)
 
         except:
-            errlog("- Error adding to Haystack")
-            e = traceback.format_exc()
-            errlog(e)
+            log.finish(ecli, 'index failed', traceback.format_exc())
+            current_day.failed.add(ecli)
             print("Error indexing - written to log")
 
 # %%
-def get_parser(cases):
-    urlfront = "https://data.rechtspraak.nl/uitspraken/content?id="
-    global mapper, mapper2, mapper3
-    mapper = pd.read_csv("~/Wetzoek_GPUbackend/instanties_map.csv",encoding="utf-8")
-    mapper2 = pd.read_csv("~/Wetzoek_GPUbackend/rechtsgebieden_map.csv",encoding="utf-8")
-    mapper3 = pd.read_csv("~/Wetzoek_GPUbackend/procedure_map.csv",encoding="utf-8")
-    for i in cases:
-        url = urlfront + i
-        print(url)
-        global dicts
-        errlog(i)
-        errlog(url)
-        dicts = parse(url)
-        errlog("- parsing complete")
-        work_dicts(dicts)
+# Fingerprints of the indexed cases (data/fingerprints.sqlite), so unchanged cases are skipped and cases of which
+# only the metadata changed get a meta update instead of being split and embedded again
+
+use_fingerprints = True
+fingerprint_name = "fingerprints.sqlite"
+prints = None
+
+def get_prints():
+    global prints
+    if prints is None:
+        prints = fingerprints.Fingerprints(os.path.join(current_directory, "data", fingerprint_name))
+    return prints
 
 # %%
-def get_meta(today):
-    global fetch_date
-    fetch_date = today # for the directory, use the date *as stored in public repository*
+# Cases are indexed in micro-batches: one preprocessing, embedding and write pass for every index_batch_size cases,
+# or for the cases gathered in index_batch_seconds, whichever comes first. If a batch fails, its cases are indexed
+# one by one, so the log says which cases failed.
+
+index_batch_size = 50
+index_batch_seconds = 60
+
+pending = [] # (ECLI, Documents, its Day, fingerprint) waiting to be indexed
+pending_since = None
+
+def index_case(ecli, docs, fp=None):
+    global pending_since
+    if not pending:
+        pending_since = time.monotonic()
+    pending.append((ecli, docs, current_day, fp))
+    if len(pending) >= index_batch_size or time.monotonic() - pending_since >= index_batch_seconds:
+        flush_index()
+
+def load_logged(docs):
+    # None if all docs were written, otherwise what went wrong
+    from gpubuild import load
+    try:
+        return None if load(docs) else "Not all documents were written"
+    except:
+        return traceback.format_exc()
+
+def flush_index():
+    global pending
+    batch, pending = pending, []
+    if not batch:
+        return
+    print("Indexing", len(batch), "cases")
+    tic = time.perf_counter()
+    error = load_logged([doc for _, docs, _, _ in batch for doc in docs])
+    seconds = time.perf_counter() - tic
+    for ecli, _, day, _ in batch:
+        day.log.add_time(ecli, 'index', seconds)
+        day.log.record(ecli)['batch'] = len(batch)
+    if error is None:
+        for ecli, _, day, _ in batch:
+            day.log.finish(ecli, 'indexed')
+        get_prints().put([(ecli, fp, fetch_date) for ecli, _, _, fp in batch if fp is not None])
+        return
+    if len(batch) > 1:
+        print("Batch failed, indexing the cases one by one")
+    for ecli, docs, day, fp in batch:
+        if len(batch) > 1:
+            with day.log.stage(ecli, 'index'):
+                error = load_logged(docs)
+        if error is None:
+            day.log.finish(ecli, 'indexed')
+            if fp is not None:
+                get_prints().put([(ecli, fp, fetch_date)])
+        else:
+            day.log.finish(ecli, 'index failed', error)
+            day.failed.add(ecli)
+            print("Error indexing", ecli, "- written to log")
 
+# %%
+def work_case(i, content, error, seconds):
+    # Parse and index one downloaded case
+    global current, dicts
+    url = fetcher.content_url + i
+    print(url)
+    current = i
+    log.start(i, url=url)
+    log.add_time(i, 'fetch', seconds)
+    if error is not None:
+        log.finish(i, 'fetch failed', repr(error))
+        current_day.failed.add(i)
+        print("Error fetching", i, "-", error)
+    else:
+        try:
+            with log.stage(i, 'parse'):
+                dicts = parse_xml(content)
+        except:
+            log.finish(i, 'parse failed', traceback.format_exc())
+            current_day.failed.add(i)
+            print("Error parsing", i)
+        else:
+            work_dicts(dicts, i)
+    current = None
+
+def get_parser(cases):
+    # The cases are downloaded concurrently in the background and parsed and indexed here as they come in
+    for i, content, error, seconds in fetcher.fetch_cases(cases):
+        work_case(i, content, error, seconds)
+    flush_index()
+
+# %%
+# Every day has its own directory, run log and shard; work_dicts writes to the ones of the day set by use_day
+
+current_directory = Path("/home/ubuntu/")
+
+class Day:
+
+    def __init__(self, today):
+        self.date = str(today)
+        # make a new directory for this date
+        self.directory = os.path.join(current_directory,"data/" + self.date)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.log = runlog.RunLog(os.path.join(self.directory, runlog.log_name))
+        # Opened on first use, so a long backfill does not keep the files of every day open
+        self.shard = None
+        self.remaining = 0
+        # ECLIs that could not be fetched, parsed, saved or indexed
+        self.failed = set()
+
+    def close(self):
+        if self.shard is not None:
+            self.shard.close()
+        self.log.close()
+
+current_day = None
+
+def use_day(day):
+    global current_day, fetch_date, final_directory, log, shard
+    current_day = day
+    fetch_date = day.date # for the directory, use the date *as stored in public repository*
+    final_directory = day.directory
+    log = day.log
+    if day.shard is None:
+        day.shard = shards.ShardWriter(day.directory)
+    shard = day.shard
 
+def get_meta(today):
     global copydate
 
     copydate = str(date.today()) # for the day of copying, use the *actual* day
 
-    # make a new directory for this date
-    current_directory = Path("/home/ubuntu/")
-    global final_directory
-    final_directory = os.path.join(current_directory,"data/" + str(today))
-    if not os.path.exists(final_directory):
-        os.makedirs(final_directory)
+    day = Day(today)
+    use_day(day)
 
-    # fetch the URL for meta-data on what cases were released that day
-    url = "http://data.rechtspraak.nl/uitspraken/zoeken?modified="+str(today)
-    page = requests.get(url,timeout=120)
-    contents = BeautifulSoup(page.content, 'html.parser')
+    # the cases that were released that day; they are fetched while the listing is still being read
+    try:
+        cases_fetch = listing.Listing(today)
+        get_parser(cases_fetch)
 
-    # fetch the header info about number of cases found
-    number = contents.find("subtitle")
-    
-    # find the ids of all the cases
-    cases = contents.find_all("id")
+        log.event('day', date=str(today), copied=copydate, cases=cases_fetch.count, found=cases_fetch.found)
+    finally:
+        # Also when the listing or the fetching fails, so the shard index keeps its pending lines
+        day.close()
 
-    cases_fetch = []
-    
-    # cycle through the ids
-    for case in cases:
-        cases_fetch.append(case.text)
-    cases_fetch.pop(0)
+# %%
+# Backfill of a range of days. The listings of all days are fetched concurrently first. A case that was modified on
+# several days is fetched once, for the last of them. Then all cases go through one fetch and index pipeline, under
+# the fetcher's rate limit. A day is finished when its last case has been indexed. A day of which every case went
+# through is written to backfill_done.txt in the data directory and skipped when the backfill is run again. The
+# ECLIs of a day with failed cases are written to failed.txt in its directory instead; a next run only fetches those.
+
+done_name = "backfill_done.txt"
+failed_name = "failed.txt"
+
+def done_days():
+    path = os.path.join(current_directory, "data", done_name)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+def mark_done(day):
+    with open(os.path.join(current_directory, "data", done_name), "a") as f:
+        f.write(day.date + "\n")
+
+def failed_cases(d):
+    # The ECLIs that failed in an earlier run of the day, or None if it has no list of them
+    path = os.path.join(current_directory, "data", d, failed_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def finish_day(day):
+    use_day(day)
+    flush_index()
+    day.close()
+    path = os.path.join(day.directory, failed_name)
+    if day.failed:
+        with open(path, "w") as f:
+            f.write("".join(ecli + "\n" for ecli in sorted(day.failed)))
+        print("Finished", day.date, "-", len(day.failed), "cases failed, retried on the next run")
+        return
+    if os.path.exists(path):
+        os.remove(path)
+    mark_done(day)
+    print("Finished", day.date)
+
+def backfill(start_dt, end_dt):
+    global copydate
+    copydate = str(date.today()) # for the day of copying, use the *actual* day
 
-    # create log file
-    loginit = "Data fetched on "+str(today)+", with "+str(len(cases_fetch))+ " / " + number.text +" cases. \n"
-    errlog(loginit)
-    errlog(url)
+    done = done_days()
+    todo = [dt.strftime("%Y-%m-%d") for dt in daterange(start_dt, end_dt)]
+    todo = [d for d in todo if d not in done]
+    print(len(todo), "days to fetch")
+
+    # Listings of all days, concurrently. A day that only has failed cases left retries just those.
+    def read_listing(d):
+        retry = failed_cases(d)
+        if retry is not None:
+            return retry, None
+        day_listing = listing.Listing(d)
+        return list(day_listing), day_listing.found
+
+    listings = {}
+    with ThreadPoolExecutor(fetcher.concurrency) as executor:
+        futures = {executor.submit(read_listing, d): d for d in todo}
+        for future in as_completed(futures):
+            d = futures[future]
+            try:
+                listings[d] = future.result()
+            except:
+                print("Error reading the listing of", d)
+                print(traceback.format_exc())
+
+    # Every case goes to the last day it was modified on
+    days = {}
+    day_of = {}
+    for d in sorted(listings):
+        days[d] = Day(d)
+        for i in listings[d][0]:
+            day_of[i] = days[d]
+    for day in day_of.values():
+        day.remaining += 1
+    for d, day in days.items():
+        day.log.event('day', date=d, copied=copydate, cases=len(listings[d][0]), found=listings[d][1],
+                      fetched_here=day.remaining)
+    print(len(day_of), "cases to fetch")
+
+    # One pipeline for the cases of all days
+    try:
+        for day in days.values():
+            if day.remaining == 0:
+                finish_day(day)
+
+        for i, content, error, seconds in fetcher.fetch_cases(day_of):
+            day = day_of[i]
+            use_day(day)
+            work_case(i, content, error, seconds)
+            day.remaining -= 1
+            if day.remaining == 0:
+                finish_day(day)
+    finally:
+        # Also when the pipeline stops early: the cases saved so far are indexed, and the days that did not finish
+        # are closed without being marked done, so the next run fetches them again
+        unfinished = [day for day in days.values() if day.remaining > 0]
+        if unfinished:
+            try:
+                flush_index()
+            finally:
+                for day in unfinished:
+                    day.close()
 
-    get_parser(cases_fetch)
 # %%
 
 dates = ['2022-08-09','2022-08-10','2022-08-11','2022-08-12','2022-08-13','2022-08-14','2022-08-15','2022-08-16',
@@ -346,21 +575,18 @@ def daterange(date1, date2):
         yield date1 + timedelta(n)
 
 if __name__ == "__main__":
-    #get_meta(str(date.today()))
-    #for i in dates:
-    #   copydate = i
-    #   get_meta(i)
-<<<<<<< HEAD
-    start_dt = date(2022, 6, 23)
-    end_dt = date(2022, 6, 23)
-    for dt in daterange(start_dt, end_dt):
-        print(dt.strftime("%Y-%m-%d"))
-        get_meta(dt.strftime("%Y-%m-%d"))
-=======
-    start_dt = date(2022, 6, 29)
-    end_dt = date(2022, 10, 16)
-    for dt in daterange(start_dt, end_dt):
-        print(dt.strftime("%Y-%m-%d"))
-        get_meta(dt.strftime("%Y-%m-%d"))
-        time.sleep(5)
->>>>>>> main
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Fetch and index the cases modified today, or backfill a range of days.")
+    arg_parser.add_argument("--from", dest="start", help="first day of the backfill (YYYY-MM-DD)")
+    arg_parser.add_argument("--to", dest="end", help="last day of the backfill (YYYY-MM-DD, default: the first day)")
+    arg_parser.add_argument("--reindex", action="store_true", help="index every case, also the ones that did not change")
+    args = arg_parser.parse_args()
+    use_fingerprints = not args.reindex
+
+    if args.start:
+        start_dt = date.fromisoformat(args.start)
+        end_dt = date.fromisoformat(args.end) if args.end else start_dt
+        backfill(start_dt, end_dt)
+    else:
+        get_meta(str(date.today()))
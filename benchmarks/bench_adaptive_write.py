@@ -0,0 +1,52 @@
+# AdaptiveWriter against a fixed batch size, on a fake document store that injects latency: every request costs a
+# fixed overhead plus a per-document cost, and requests slower than the timeout fail the way Weaviate cancels them.
+#
+#   python benchmarks/bench_adaptive_write.py [n_docs]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Wetzoek_GPUbackend'))
+
+from batch_writer import AdaptiveWriter
+
+
+class FakeStore:
+
+    def __init__(self, overhead=0.02, per_doc=0.001, timeout=0.25, jitter=0.2, seed=0):
+        self.overhead = overhead
+        self.per_doc = per_doc
+        self.timeout = timeout
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.docs = {}
+
+    def write_documents(self, documents, index=None, batch_size=None, duplicate_documents=None):
+        latency = (self.overhead + self.per_doc * len(documents)) * (1 + self.rng.uniform(-self.jitter, self.jitter))
+        if latency > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError("The 'objects' creation was cancelled because it took longer than the configured timeout")
+        time.sleep(latency)
+        for d in documents:
+            self.docs[d['id']] = d
+
+
+def run(name, writer, docs):
+    report = writer.write(docs)
+    assert len(writer.store.docs) + len(report['failed']) == len(docs)
+    print("%-10s %6.1f docs/s  %d failed  final batch size %d" % (name, report['docs_per_s'], len(report['failed']), report['batch_size']))
+
+
+if __name__ == "__main__":
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    docs = [{'id': str(i), 'content': 'passage %d' % i} for i in range(n_docs)]
+
+    fixed = AdaptiveWriter(FakeStore(), 'splitdoc', batch_size=5, min_batch_size=5, max_batch_size=5, sleep=lambda s: None)
+    too_big = AdaptiveWriter(FakeStore(), 'splitdoc', batch_size=500, min_batch_size=500, max_batch_size=500, retries=1, sleep=lambda s: None)
+    adaptive = AdaptiveWriter(FakeStore(), 'splitdoc', batch_size=5, target_latency=0.15, sleep=lambda s: time.sleep(s / 100))
+
+    run("fixed 5", fixed, docs)
+    run("fixed 500", too_big, docs[:1000])
+    run("adaptive", adaptive, docs)
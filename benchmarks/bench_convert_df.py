@@ -0,0 +1,77 @@
+# Micro-benchmark of gpubuild.convert_df on a 100k-row case frame, against the record-by-record conversion it
+# replaced (to_dict(orient="records") followed by a loop that rebuilds every dict).
+#
+#   python benchmarks/bench_convert_df.py [n_rows]
+
+import datetime
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Wetzoek_GPUbackend'))
+
+import gpubuild
+
+
+def convert_records(df):
+    # The previous implementation of gpubuild.convert_df
+    ret = []
+    df = df.reset_index(drop=True)
+    df = df.fillna(" - ")
+    df = df.rename(columns=gpubuild.MAPPING)
+    df['added'] = datetime.datetime.today().strftime('%Y-%m-%d')
+    df = df[df.columns.intersection(gpubuild.cols_allow)]
+    records = df.to_dict(orient="records")
+    for i, r in enumerate(records):
+        text = r.pop("content")
+        ids = r.pop("id")
+        r['code'] = str(ids)
+        if text is not None:
+            ret.append({"content": text, "id": ids, "meta": r})
+    return ret
+
+
+def frame(n):
+    rng = random.Random(0)
+    df = pd.DataFrame({
+        'id': ['ECLI:NL:RBAMS:2015:%d' % i for i in range(n)],
+        'issued': '2015-03-01',
+        'instantie': [rng.choice(['Rechtbank Amsterdam', 'Hoge Raad', 'Raad van State']) for _ in range(n)],
+        'datum': '2015-02-27',
+        'zaaknummer': ['C/13/%06d' % i for i in range(n)],
+        'type': 'Uitspraak',
+        'procedure': [rng.choice(['Eerste aanleg - enkelvoudig', 'Hoger beroep', 'Geen informatie']) for _ in range(n)],
+        'vindplaatsen': "['NJ 2015/1']",
+        'inhoudsindicatie': 'Ontslag op staande voet. Dringende reden aanwezig.',
+        'titel': ['ECLI:NL:RBAMS:2015:%d: zaak C/13/%06d van 2015-02-27 bij de Rechtbank Amsterdam' % (i, i) for i in range(n)],
+        'filesize': np.arange(n),
+        'Bron': 'Jurisprudentie',
+        'text': ['Tekst van de uitspraak %d.' % i if i % 50 else None for i in range(n)],
+    })
+    return df
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    df = frame(n)
+
+    tic = time.perf_counter()
+    old = convert_records(df)
+    t_old = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    new = gpubuild.convert_df(df)
+    t_new = time.perf_counter() - tic
+
+    # The old conversion kept rows without text as " - "; the new one drops them
+    assert len(new) == df['text'].notna().sum()
+    assert [d.meta for d in new] == [r['meta'] for r in old if r['content'] != " - "]
+
+    print("rows:            ", n)
+    print("records + loop:   %.2fs  (%d dicts)" % (t_old, len(old)))
+    print("convert_df:       %.2fs  (%d Documents)" % (t_new, len(new)))
+    print("speedup:          %.1fx" % (t_old / t_new))
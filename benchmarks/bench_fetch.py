@@ -0,0 +1,140 @@
+# Downloading a day of cases one by one with requests.get (as update_build did) against fetcher.fetch_cases, on a
+# local stub of the open data content endpoint. The stub serves synthetic case XMLs after a fixed latency and
+# answers a share of the requests with a 503, which the fetcher has to retry. A last run consumes the cases slowly
+# and checks that the downloads waiting to be consumed stay bounded. tests/test_listing.py uses the same stub for
+# the paged listing.
+#
+#   python benchmarks/bench_fetch.py [n_cases]
+
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', 'Wetzoek_GPUbackend'))
+
+import fetcher
+from synthetic import make_xml
+
+
+def listing_page(ids, found):
+    # One page of the zoeken?modified= Atom feed
+    entries = ''.join('<entry><id>%s</id><title>%s</title></entry>' % (id, id) for id in ids)
+    return ('<feed xmlns="http://www.w3.org/2005/Atom"><title>Rechtspraak.nl</title>'
+            '<subtitle>Aantal gevonden ECLI\'s: %d</subtitle><id>zoeken</id>%s</feed>' % (found, entries)).encode('utf-8')
+
+
+def stub_server(cases, latency=0.05, flaky=0.05, seed=0, listings=None, cut=0.0):
+    '''
+    Serve cases (ECLI -> XML bytes) on /uitspraken/content?id=<ECLI> from a background thread, and the listings
+    (day -> ECLIs) on /uitspraken/zoeken?modified=<day> in pages, with the max and from parameters. A share flaky
+    of the requests is answered with a 503, and a share cut of the listing pages breaks off halfway. Returns the
+    server; server.served counts the cases it sent and server.cut the pages it broke off.
+    '''
+    rng = random.Random(seed)
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            time.sleep(latency)
+            query = parse_qs(urlparse(self.path).query)
+            if 'modified' in query:
+                self.listing(query)
+                return
+            id = query.get('id', [''])[0]
+            if id not in cases:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if rng.random() < flaky:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = cases[id]
+            server.served += 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def listing(self, query):
+            if rng.random() < flaky:
+                self.send_response(503)
+                self.end_headers()
+                return
+            ids = (listings or {}).get(query['modified'][0], [])
+            start = int(query['from'][0])
+            body = listing_page(ids[start:start + int(query['max'][0])], len(ids))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/atom+xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if rng.random() < cut:
+                server.cut += 1
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.served = 0
+    server.cut = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(0)
+    cases = dict(make_xml(rng, 2022, n) for n in range(n_cases))
+    server = stub_server(cases)
+    base_url = "http://127.0.0.1:%d/uitspraken/content?id=" % server.server_address[1]
+    fetcher.backoff = 0.1
+    fetcher.rate = None
+
+    tic = time.perf_counter()
+    sequential = 0
+    for id in cases:
+        for attempt in range(fetcher.retries + 1):
+            response = requests.get(base_url + id, timeout=fetcher.timeout)
+            if response.status_code == 200:
+                sequential += 1
+                break
+    seconds_sequential = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    fetched = {}
+    errors = 0
+    for id, content, error, seconds in fetcher.fetch_cases(cases, base_url):
+        if error is None:
+            fetched[id] = content
+        else:
+            errors += 1
+    seconds_async = time.perf_counter() - tic
+
+    # A consumer slower than the fetcher: the backlog of sent but not yet consumed cases has to stay bounded
+    served = server.served
+    backlog = 0
+    for consumed, item in enumerate(fetcher.fetch_cases(list(cases)[:fetcher.queue_size * 3], base_url), 1):
+        time.sleep(0.05)
+        backlog = max(backlog, server.served - served - consumed)
+    bound = fetcher.queue_size + 2 * fetcher.concurrency + 1
+    server.shutdown()
+
+    assert all(cases[id] == content for id, content in fetched.items())
+    print("cases: %d, stub latency 50 ms, 5%% answered with 503" % n_cases)
+    print("requests.get one by one: %.1fs (%d fetched)" % (seconds_sequential, sequential))
+    print("fetch_cases, %d at once: %.1fs (%d fetched, %d failed, %.1fx)"
+          % (fetcher.concurrency, seconds_async, len(fetched), errors, seconds_sequential / seconds_async))
+    print("slow consumer: at most %d downloads waiting (bound %d)" % (backlog, bound))
+    assert backlog <= bound
@@ -0,0 +1,79 @@
+# File size and reload time of the pipe-separated case exports against Parquet, with and without column
+# projection to the fields the loaders use (MAPPING in haystack_load.py).
+#
+#   python benchmarks/bench_formats.py [caseinfopush_<year>.csv ...]
+#
+# Without arguments it builds a caseinfopush-shaped CSV from a synthetic year of cases.
+
+import ast
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+import parser
+from synthetic import make_corpus
+
+
+def loader_columns():
+    # MAPPING is read from the source, so this runs without Haystack installed
+    with open(os.path.join(root, 'haystack_load.py')) as f:
+        for node in ast.parse(f.read()).body:
+            if isinstance(node, ast.Assign) and node.targets[0].id == 'MAPPING':
+                return list(ast.literal_eval(node.value))
+
+
+def synthetic_push(tmp, n_docs):
+    cases = []
+    for path in make_corpus(tmp, n_docs=n_docs):
+        with zipfile.ZipFile(path) as z:
+            for j in z.infolist():
+                with z.open(j) as f:
+                    meta, text = parser.parse_stream(f)
+                meta['filesize'] = j.file_size
+                meta['Bron'] = 'Jurisprudentie'
+                meta['text'] = text['tekst']
+                cases.append(meta)
+    df = pd.DataFrame(cases).rename(columns={'identifier': 'id'})
+    filename = os.path.join(tmp, 'caseinfopush_synthetic.csv')
+    df.to_csv(filename, mode='w+', header=True, encoding="utf-8", sep='|')
+    return filename
+
+
+def timed(fn):
+    tic = time.perf_counter()
+    rows = fn()
+    return time.perf_counter() - tic, rows
+
+
+def bench(filename, columns):
+    parquet = parser.csv_to_parquet(filename, os.path.join(tempfile.gettempdir(), os.path.basename(filename)[:-4] + '.parquet'))
+    names = [c for c in pq.ParquetFile(parquet).schema_arrow.names if c in columns]
+
+    t_csv, n = timed(lambda: len(pd.read_csv(filename, sep="|")))
+    t_csv_proj, _ = timed(lambda: sum(len(df) for df in pd.read_csv(filename, sep="|", usecols=lambda c: c in columns, chunksize=10000)))
+    t_pq, _ = timed(lambda: len(pd.read_parquet(parquet)))
+    t_pq_proj, _ = timed(lambda: sum(b.num_rows for b in pq.ParquetFile(parquet).iter_batches(batch_size=10000, columns=names)))
+
+    print(os.path.basename(filename), "-", n, "rows")
+    print("  size      csv %8.1f MB   parquet %8.1f MB" % (os.path.getsize(filename) / 1e6, os.path.getsize(parquet) / 1e6))
+    print("  full      csv %8.2f s    parquet %8.2f s" % (t_csv, t_pq))
+    print("  projected csv %8.2f s    parquet %8.2f s" % (t_csv_proj, t_pq_proj))
+    os.remove(parquet)
+
+
+if __name__ == "__main__":
+    columns = loader_columns()
+    if len(sys.argv) > 1:
+        for filename in sys.argv[1:]:
+            bench(filename, columns)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            bench(synthetic_push(tmp, 5000), columns)
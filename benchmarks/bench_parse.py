@@ -0,0 +1,84 @@
+# Compares the tree-based parser.parse with the single-pass parser.parse_stream on a synthetic corpus, and their
+# peak memory on one case with a long ruling. parse_members uses parse_stream only for members larger than
+# parser.stream_size.
+#
+#   python benchmarks/bench_parse.py [n_docs]
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import parser
+from synthetic import make_corpus, make_xml
+
+
+def documents(zips):
+    for path in zips:
+        with zipfile.ZipFile(path) as z:
+            for j in z.infolist():
+                with z.open(j) as f:
+                    yield f
+
+
+def run(fn, zips):
+    # Timed without tracemalloc; peak is measured in a second pass as the largest memory use of a single parse
+    # call, above what was allocated before it, so the growing list of results does not count
+    tic = time.perf_counter()
+    out = [fn(f) for f in documents(zips)]
+    toc = time.perf_counter()
+    peak = 0
+    tracemalloc.start()
+    for f in documents(zips):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(f)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return out, toc - tic, peak
+
+
+def large_case(paragraphs=40000):
+    # One synthetic case with a ruling of the given number of paragraphs, as XML bytes
+    _, xml = make_xml(random.Random(0), 2022, 0)
+    xml = xml.decode('utf-8')
+    start = xml.index('>', xml.index('<uitspraak')) + 1
+    body = ''.join('<section><para>Overweging %d van het hof. <emphasis>Nadruk</emphasis> en meer tekst.</para></section>\n' % k
+                   for k in range(paragraphs))
+    return (xml[:start] + body + xml[start:]).encode('utf-8')
+
+
+def peak(fn, xml):
+    tracemalloc.start()
+    result = fn(io.BytesIO(xml))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+
+if __name__ == "__main__":
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        zips = make_corpus(tmp, n_docs=n_docs)
+
+        tree, t_tree, m_tree = run(parser.parse, zips)
+        stream, t_stream, m_stream = run(parser.parse_stream, zips)
+
+        assert tree == stream, "parse_stream output differs from parse"
+
+        print("docs:          ", n_docs)
+        print("parse:          %.2fs  %6.0f docs/s  peak per doc %.0f kB" % (t_tree, n_docs / t_tree, m_tree / 1e3))
+        print("parse_stream:   %.2fs  %6.0f docs/s  peak per doc %.0f kB" % (t_stream, n_docs / t_stream, m_stream / 1e3))
+        print("speedup:        %.2fx" % (t_tree / t_stream))
+
+    xml = large_case()
+    tree, m_tree = peak(parser.parse, xml)
+    stream, m_stream = peak(parser.parse_stream, xml)
+    assert tree == stream, "parse_stream output differs from parse"
+    print("one case of %.1f MB: parse peak %.1f MB, parse_stream peak %.1f MB" % (len(xml) / 1e6, m_tree / 1e6, m_stream / 1e6))
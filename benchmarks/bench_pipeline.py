@@ -0,0 +1,78 @@
+# End-to-end wall-clock of gpubuild.cases_to_dicts on a multi-chunk caseinfopush CSV, with chunks loaded one after
+# the other (pipelined = False) and with embedding overlapped with the writes (pipelined = True). Preprocessing is
+# Haystack's own PreProcessor; the embedding model and the document stores are stand-ins with a fixed cost, so the
+# benchmark needs Haystack installed but no model download and no running stores.
+#
+#   python benchmarks/bench_pipeline.py [n_docs]
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', 'Wetzoek_GPUbackend'))
+
+import gpubuild
+from batch_writer import AdaptiveWriter
+from bench_formats import synthetic_push
+from haystack.nodes import PreProcessor
+
+
+class FakeRetriever:
+
+    def __init__(self, per_passage=0.0005):
+        self.per_passage = per_passage
+
+    def embed_documents(self, docs):
+        # Stands in for the model: costs time, but releases the GIL like torch does
+        time.sleep(self.per_passage * len(docs))
+        return np.zeros((len(docs), 768), dtype=np.float32)
+
+
+class FakeStore:
+
+    def __init__(self, overhead=0.05, per_doc=0.0005):
+        self.overhead = overhead
+        self.per_doc = per_doc
+
+    def write_documents(self, documents, index=None, batch_size=None, duplicate_documents=None):
+        time.sleep(self.overhead + self.per_doc * len(documents))
+
+
+class FakeContext:
+
+    def __init__(self):
+        self.document_store = FakeStore()
+        self.split_document_store = FakeStore()
+        self.split_writer = AdaptiveWriter(self.split_document_store, gpubuild.split_doc_index, batch_size=200,
+                                           duplicate_documents='overwrite')
+        self.preprocessor = PreProcessor(split_length=gpubuild.split_length)
+        self.pre_retriever = FakeRetriever()
+        self.tokenizer = None
+        self.cache = None
+        self.checkpoint = None
+        self.limiter = None
+
+
+if __name__ == "__main__":
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    gpubuild.pre_embed = True
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = synthetic_push(tmp, n_docs)
+        gpubuild.doc_dir = Path(tmp)
+        timings = {}
+        for pipelined in (False, True):
+            gpubuild.pipelined = pipelined
+            tic = time.perf_counter()
+            gpubuild.cases_to_dicts(os.path.basename(filename), FakeContext())
+            timings[pipelined] = time.perf_counter() - tic
+
+    chunks = -(-n_docs // gpubuild.chunk_size)
+    print()
+    print("docs: %d in %d chunks" % (n_docs, chunks))
+    print("sequential: %.1fs" % timings[False])
+    print("pipelined:  %.1fs (%.2fx)" % (timings[True], timings[False] / timings[True]))
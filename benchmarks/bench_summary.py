@@ -0,0 +1,39 @@
+# Micro-benchmark of parser.clean_summary on summaries shaped like the inhoudsindicatie of real cases, as
+# itertext returns them. What the cleaner does is checked in tests/test_summary.py.
+#
+#   python benchmarks/bench_summary.py [n]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import parser
+from synthetic import sentence
+
+
+def summary(rng):
+    # Paragraphs on their own indented lines, with the odd non-breaking space and soft hyphen
+    paras = []
+    for _ in range(rng.randint(1, 4)):
+        text = sentence(rng, rng.randint(10, 60))
+        if rng.random() < 0.3:
+            text = text.replace(' ', ' ', 2)
+        if rng.random() < 0.1:
+            text = text.replace('over', 'over­')
+        paras.append('\n        ' + text)
+    return ''.join(paras) + '\n      '
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(0)
+    summaries = [summary(rng) for _ in range(n)]
+
+    tic = time.perf_counter()
+    for s in summaries:
+        parser.clean_summary(s)
+    toc = time.perf_counter()
+    print("clean_summary    %.2fs  %8.0f summaries/s" % (toc - tic, n / (toc - tic)))
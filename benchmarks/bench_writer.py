@@ -0,0 +1,56 @@
+# Throughput of the per-case parser.appendcsv against the buffered parser.CaseWriter on a synthetic year.
+#
+#   python benchmarks/bench_writer.py [n_docs]
+
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import parser
+from synthetic import make_corpus
+
+
+def load_cases(zips):
+    cases = []
+    for path in zips:
+        with zipfile.ZipFile(path) as z:
+            for j in z.infolist():
+                with z.open(j) as f:
+                    meta, text = parser.parse_stream(f)
+                meta['filesize'] = j.file_size
+                cases.append((meta, text['tekst']))
+    return cases
+
+
+def read(year):
+    with open("caseinfo_" + year + ".csv", 'rb') as f1, open("casetext_" + year + ".csv", 'rb') as f2:
+        return f1.read(), f2.read()
+
+
+if __name__ == "__main__":
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = load_cases(make_corpus(tmp, n_docs=n_docs))
+        os.chdir(tmp)
+
+        tic = time.perf_counter()
+        for meta, tekst in cases:
+            parser.appendcsv({meta['identifier']: meta}, {meta['identifier']: tekst}, 'old')
+        t_old = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        with parser.CaseWriter('new', max_rows=1000) as writer:
+            for meta, tekst in cases:
+                writer.add(meta, tekst)
+        t_new = time.perf_counter() - tic
+
+        assert read('old') == read('new'), "CaseWriter output differs from appendcsv"
+
+        print("cases:       ", n_docs)
+        print("appendcsv:    %.2fs  %7.0f cases/s" % (t_old, n_docs / t_old))
+        print("CaseWriter:   %.2fs  %7.0f cases/s" % (t_new, n_docs / t_new))
+        print("speedup:      %.1fx" % (t_old / t_new))
@@ -0,0 +1,98 @@
+# Synthetic Rechtspraak open data, shaped like the XMLs in the OpenDataUitspraken zips.
+# Used by the benchmarks so they can run without a copy of the real dump.
+
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+instanties = ['Rechtbank Amsterdam', 'Rechtbank Rotterdam', 'Gerechtshof Den Haag', 'Hoge Raad', 'Raad van State',
+              'Centrale Raad van Beroep', 'Rechtbank Noord-Holland']
+codes = ['RBAMS', 'RBROT', 'GHDHA', 'HR', 'RVS', 'CRVB', 'RBNHO']
+procedures = ['Eerste aanleg - enkelvoudig', 'Eerste aanleg - meervoudig', 'Hoger beroep', 'Cassatie', 'Kort geding']
+gebieden = ['Civiel recht', 'Strafrecht', 'Bestuursrecht', 'Civiel recht; Arbeidsrecht', 'Bestuursrecht; Socialezekerheidsrecht']
+words = ('de het een van en in is dat op te voor met niet zijn door aan bij als ook dan tot uit naar over '
+         'rechtbank eiser gedaagde verweerder hof vonnis beroep overeenkomst schade vordering bewijs '
+         'artikel wet besluit termijn partijen kosten uitspraak grond oordeel hoger cassatie').split()
+
+
+def sentence(rng, n):
+    return ' '.join(rng.choice(words) for _ in range(n)).capitalize() + '.'
+
+
+def paragraph(rng):
+    # Mixed content: emphasis and footnote references leave tails behind that itertext has to pick up
+    parts = [escape(sentence(rng, rng.randint(8, 30)))]
+    if rng.random() < 0.3:
+        parts.append('<emphasis role="italic">' + escape(sentence(rng, 3)) + '</emphasis> ' + escape(sentence(rng, 6)))
+    if rng.random() < 0.1:
+        parts.append('<footnote-ref label="1"/>')
+    return '<para>' + ' '.join(parts) + '</para>'
+
+
+def make_xml(rng, year, n):
+    k = rng.randrange(len(codes))
+    ecli = 'ECLI:NL:%s:%d:%d' % (codes[k], year, n)
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+
+    rdf = ['<dcterms:identifier>%s</dcterms:identifier>' % ecli,
+           '<dcterms:format>text/xml</dcterms:format>',
+           '<dcterms:issued rdfs:label="Publicatiedatum">%d-%02d-%02d</dcterms:issued>' % (year, month, day),
+           '<dcterms:publisher>Raad voor de Rechtspraak</dcterms:publisher>',
+           '<dcterms:creator>%s</dcterms:creator>' % instanties[k],
+           '<dcterms:date rdfs:label="Uitspraakdatum">%d-%02d-%02d</dcterms:date>' % (year, month, day),
+           '<psi:zaaknummer>%d/%06d</psi:zaaknummer>' % (year, n),
+           '<dcterms:type>Uitspraak</dcterms:type>',
+           '<dcterms:coverage>NL</dcterms:coverage>']
+    if rng.random() < 0.8:
+        rdf.append('<psi:procedure>%s</psi:procedure>' % rng.choice(procedures))
+    if rng.random() < 0.3:
+        rdf.append('<dcterms:replaces>LJN %s%04d</dcterms:replaces>' % (rng.choice('ABCD'), n % 10000))
+    for gebied in rng.sample(gebieden, rng.randint(1, 2)):
+        rdf.append('<dcterms:subject>%s</dcterms:subject>' % gebied)
+    for _ in range(rng.randint(0, 2)):
+        rdf.append('<dcterms:relation>ECLI:NL:%s:%d:%d</dcterms:relation>' % (rng.choice(codes), year - 1, rng.randint(1, 9999)))
+    for _ in range(rng.randint(0, 3)):
+        rdf.append('<dcterms:references>BWBR%07d</dcterms:references>' % rng.randint(1, 9999999))
+    vindplaatsen = ['<rdf:li>%s %d/%d</rdf:li>' % (rng.choice(['NJ', 'JAR', 'AB', 'Rechtspraak.nl']), year, rng.randint(1, 999))
+                    for _ in range(rng.randint(0, 4))]
+    if vindplaatsen:
+        rdf.append('<dcterms:hasVersion><rdf:list>%s</rdf:list></dcterms:hasVersion>' % ''.join(vindplaatsen))
+
+    parts = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<open-rechtspraak>',
+             '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#" '
+             'xmlns:dcterms="http://purl.org/dc/terms/" xmlns:psi="http://psi.rechtspraak.nl/">',
+             '<rdf:Description>' + ''.join(rdf) + '</rdf:Description>',
+             '</rdf:RDF>']
+    if rng.random() < 0.85:
+        parts.append('<inhoudsindicatie xmlns="http://www.rechtspraak.nl/schema/rechtspraak-1.0" id="%s:INH">' % ecli
+                     + ''.join(paragraph(rng) for _ in range(rng.randint(1, 3))) + '</inhoudsindicatie>')
+    sections = []
+    for s in range(rng.randint(2, 8)):
+        sections.append('<section><title><nr>%d</nr>%s</title>' % (s + 1, escape(sentence(rng, 3)))
+                        + ''.join(paragraph(rng) for _ in range(rng.randint(2, 12))) + '</section>')
+    parts.append('<uitspraak xmlns="http://www.rechtspraak.nl/schema/rechtspraak-1.0" id="%s:DOC">' % ecli
+                 + ''.join(sections) + '</uitspraak>')
+    parts.append('</open-rechtspraak>')
+    return ecli, '\n'.join(parts).encode('utf-8')
+
+
+def make_corpus(directory, year=2015, n_docs=2000, docs_per_zip=500, seed=0):
+    '''
+    Write n_docs synthetic case XMLs for one year into <directory>/<year>/, packed in zips like the open data dump.
+    Returns the list of zip paths.
+    '''
+    rng = random.Random(seed)
+    year_dir = os.path.join(directory, str(year))
+    os.makedirs(year_dir, exist_ok=True)
+    zips = []
+    for start in range(0, n_docs, docs_per_zip):
+        path = os.path.join(year_dir, '%d%02d.zip' % (year, len(zips) + 1))
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for n in range(start, min(start + docs_per_zip, n_docs)):
+                ecli, xml = make_xml(rng, year, n + 1)
+                z.writestr(ecli.replace(':', '_') + '.xml', xml)
+        zips.append(path)
+    return zips
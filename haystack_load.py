@@ -3,6 +3,8 @@ import subprocess
 import time
 import json
 import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 
 from haystack.document_stores import ElasticsearchDocumentStore
 from haystack.utils import launch_es
@@ -10,7 +12,6 @@ import pandas as pd
 from pathlib import Path
 from haystack.nodes import PreProcessor
 import numpy as np
-import dateutil
 import datetime
 from datetime import date
 
@@ -36,10 +37,14 @@ MAPPING = {
 logger = logging.getLogger(__name__)
 
 doc_index = "document"
+split_doc_index = "splitdoc"
 language = "dutch"
 n_docs = 2000000
 doc_dir = Path("~/data")
 split_length = 100
+chunk_size = 10000 # rows read and processed at a time
+n_workers = os.cpu_count() # processes running the PreProcessor
+write_batch_size = 10000
 
 files = [
 'caseinfopush_1991.csv',
@@ -75,58 +80,117 @@ files = [
 'caseinfopush_2021.csv',
 ]
 
+# read_frames is the same function as in Wetzoek_GPUbackend/gpubuild.py; tests/test_read_frames.py checks that the
+# two stay the same
+
+def read_frames(filename, columns, chunksize=None):
+    '''
+    Read a case export in chunks, keeping only the given columns. Parquet files are streamed row group by
+    row group, CSV files with chunksize, so only one chunk is in memory at a time. At most n_docs rows are read.
+    '''
+    chunksize = chunksize or chunk_size
+    path = os.path.expanduser(str(doc_dir / filename))
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        names = [c for c in pf.schema_arrow.names if c in columns]
+        left = n_docs
+        for batch in pf.iter_batches(batch_size=chunksize, columns=names):
+            if left <= 0:
+                break
+            df = batch.to_pandas()[:left]
+            left -= len(df)
+            yield df
+    else:
+        yield from pd.read_csv(path, nrows=n_docs, sep="|", usecols=lambda c: c in columns, chunksize=chunksize)
+
 def cases_to_dicts(filename_cases,type='Cases'):
-    ret = []
-    df = pd.read_csv(doc_dir / filename_cases, nrows=n_docs, sep="|")
-    df = df.reset_index(drop=True)
-    df = df.replace({np.nan: None})
-
-    df = df.rename(columns=MAPPING)
-    df["date"] = df["date"].apply(dateutil.parser.parse)
-    records = df.to_dict(orient="records")
-    for i, r in enumerate(records):
-        text = r.pop("content")
-        id = r.pop("id")
-        print("Printing name")
-        r["name"] = str(i)
-        ret.append(
-            {"content": text, "id":id,  "meta": r}
-        )
-
-    return ret
+    '''
+    Generate Haystack dicts from a case export. The file is read chunk_size rows at a time, so dicts are
+    produced while the rest of the file is still on disk.
+    '''
+    i = 0
+    for df in read_frames(filename_cases, MAPPING, chunk_size):
+        df = df.rename(columns=MAPPING)
+        dates = pd.to_datetime(df["date"], errors="coerce")
+        df = df.replace({np.nan: None})
+        df["date"] = dates.astype(object).where(dates.notna(), None)
+        records = df.to_dict(orient="records")
+        for r in records:
+            text = r.pop("content")
+            id = r.pop("id")
+            r["name"] = str(i)
+            i += 1
+            yield {"content": text, "id":id,  "meta": r}
+
+def batches(dicts, size):
+    '''
+    Group an iterable of dicts into lists of at most size dicts
+    '''
+    dicts = iter(dicts)
+    while True:
+        batch = list(itertools.islice(dicts, size))
+        if not batch:
+            return
+        yield batch
+
+def init_preprocessor():
+    global worker_preprocessor
+    worker_preprocessor = PreProcessor(split_length=split_length)
+
+def preprocess_shard(dicts):
+    return worker_preprocessor.process(documents=dicts)
+
+def preprocess(executor, dicts):
+    '''
+    Split a batch of dicts into passages on the worker pool. The batch is cut into one shard per worker; the split
+    documents come back in the order of the input.
+    '''
+    size = max(1, -(-len(dicts) // n_workers))
+    shards = [dicts[i:i+size] for i in range(0, len(dicts), size)]
+    docs = []
+    for part in executor.map(preprocess_shard, shards):
+        docs.extend(part)
+    return docs
 
 def main(filename_cases,type_fn):
     launch_es()
     document_store = ElasticsearchDocumentStore(analyzer=language, index=doc_index, timeout=300)
+    split_document_store = ElasticsearchDocumentStore(analyzer=language, index=split_doc_index, timeout=300)
     print("Reading file...")
 
-    dicts = cases_to_dicts(filename_cases,type_fn)
-
-    print()
+    # Documents flow through preprocessing and writing one batch at a time, while the rest of the file is still
+    # being read. The full documents go to doc_index, their passages to split_doc_index
+    n_dicts = 0
+    n_split = 0
+    t_pre = 0
+    t_write = 0
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_preprocessor) as executor:
+        for dicts in batches(cases_to_dicts(filename_cases,type_fn), chunk_size):
+            n_dicts += len(dicts)
+
+            tic = time.perf_counter()
+            docs = preprocess(executor, dicts)
+            toc = time.perf_counter()
+            t_pre += toc-tic
+            n_split += len(docs)
+
+            tic = time.perf_counter()
+            split_document_store.write_documents(docs, index=split_doc_index,duplicate_documents='overwrite',batch_size=write_batch_size)
+            document_store.write_documents(dicts, index=doc_index,duplicate_documents='overwrite',batch_size=write_batch_size)
+            toc = time.perf_counter()
+            t_write += toc-tic
+
+            print(n_dicts, "docs,", n_split, "split docs")
 
     print("Number of docs before splitting")
-    print(len(dicts))
-    print()
-    preprocessor = PreProcessor(split_length=split_length)
-    tic = time.perf_counter()
-
-    print("Preprocessing...")
-    docs = preprocessor.process(documents=dicts)
-    toc = time.perf_counter()
-
-    print(toc-tic)
-
+    print(n_dicts)
     print("Number of split docs")
-    print(len(docs))
-
-    tic = time.perf_counter()
+    print(n_split)
+    print("Preprocessing...")
+    print(t_pre)
     print("Writing to document store...")
-
-    document_store.write_documents(dicts, index=doc_index,duplicate_documents='overwrite')
-
-    toc = time.perf_counter()
-
-    print(toc-tic)
+    print(t_write)
 
 if __name__ == "__main__":
     for i in files:
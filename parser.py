@@ -4,7 +4,16 @@ import xml.etree.ElementTree as et
 import os
 import io
 import re
+import sqlite3
 import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 
 # The purpose of this script is to do the following:
@@ -87,11 +96,66 @@ meta_3 = ('{http://www.rechtspraak.nl/schema/rechtspraak-1.0}para',
  
 conclusie = ('{http://www.rechtspraak.nl/schema/rechtspraak-1.0}uitspraak','{http://www.rechtspraak.nl/schema/rechtspraak-1.0}conclusie')
 
+# The streaming parser looks tags up the other way round: from the tag it meets to the meta key it fills.
+# first_tags keep only their first text instance, list_tags collect every text instance in document order
+
+first_tags = {namespaces[x] : x for x in meta_1 if x != 'rechtsgebied'}
+
+list_tags = {namespaces['rechtsgebied'] : 'rechtsgebied',
+             namespaces['opsom'] : 'vindplaatsen',
+             namespaces['references'] : 'references',
+             namespaces['relatie'] : 'relatie'}
+
+# Summaries are normalised in the parse pass. itertext leaves the layout of the XML behind (line breaks and
+# indentation, non-breaking spaces), as well as invisible characters (soft hyphens, zero-width spaces) and now and
+# then a tag that was escaped into the text. The patterns are compiled once, here
+
+summary_markup = re.compile(r"</?[A-Za-z][\w:.-]*(?:\s[^<>]*)?/?>")
+summary_invisible = re.compile("[\u00ad\u200b\u200c\u200d\u2060\ufeff]")
+summary_whitespace = re.compile(r"\s+")
+summary_punctuation = re.compile(r" ([.,;:!?)])")
+
+# itertext adds nothing between elements, so the paragraphs of a summary would run together ("de.Aan"). Block
+# elements get a line break before and after them, which clean_summary turns into a single space
+
+summary_blocks = {'{http://www.rechtspraak.nl/schema/rechtspraak-1.0}' + x
+                  for x in ('para', 'parablock', 'paragroup', 'title', 'bridgehead', 'listitem', 'blockquote', 'row')}
+
+def summary_text(elem):
+    parts = [elem.text or '']
+    for child in elem:
+        inner = summary_text(child)
+        parts.append('\n' + inner + '\n' if child.tag in summary_blocks else inner)
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+def clean_summary(summary):
+    if "<" in summary:
+        summary = summary_markup.sub(" ", summary)
+    summary = summary_invisible.sub("", summary)
+    summary = summary_whitespace.sub(" ", summary)
+    return summary_punctuation.sub(r"\1", summary).strip()
+
+# Members larger than stream_size bytes (uncompressed) are parsed with parse_stream, which holds far less of a
+# long ruling in memory; the rest go through the tree-based parse function, which is faster per case. Set to None
+# to always use parse
+
+stream_size = 2000000
+
+# Parsing runs in a pool of worker processes. Each task is a chunk of chunk_size XML members from one zip;
+# a single writer in the main process appends the results in zip and member order
+
+n_workers = os.cpu_count()
+chunk_size = 200
+
 # %%
-# PARSE function parses the XML file
+# NEW_META returns an empty metadata record
 
-def parse(doc):
-    meta={'identifier':'',
+def new_meta():
+    '''
+    Empty metadata record; the key order is the column order of the caseinfo CSVs
+    '''
+    return {'identifier':'',
         'issued':'',
         'publisher':'',
         'instantie':'',
@@ -109,6 +173,12 @@ def parse(doc):
         'commentaren':'',
         'titel':'',
          }
+
+# %%
+# PARSE function parses the XML file
+
+def parse(doc):
+    meta = new_meta()
     text={}
 
     xtree = et.parse(doc)
@@ -149,14 +219,8 @@ def parse(doc):
     # Capture the second part of the XML: a summary of the case
     #print("--Summary and full text")
 
-    try:
-        for child in xroot.iter(namespaces['inhoudsindicatie']):
-            #print(child.text)
-            meta['inhoudsindicatie'] = re.sub(string,"",''.join(child.itertext()))
-            #print("is er")
-    except:
-        meta['inhoudsindicatie'] = " "
-        #print("---No summary")
+    for child in xroot.iter(namespaces['inhoudsindicatie']):
+        meta['inhoudsindicatie'] = clean_summary(summary_text(child))
 
     try:
         x = xroot[2].tag
@@ -168,7 +232,101 @@ def parse(doc):
     
     return(meta,text)
 
-# PARSE function parses the XML file
+# %%
+# PARSE_STREAM parses the XML file in a single pass with iterparse. It returns the same (meta, text) as PARSE,
+# without building the whole tree: the text of every element is collected at its 'end' event, after which its
+# children are dropped. Only the element shells on the open path (and the text collected so far) stay in memory,
+# not the subtrees of the ruling.
+
+def parse_stream(doc):
+    meta = new_meta()
+    text={}
+
+    found = set()
+    pending = []
+    lists = {'rechtsgebied':[], 'vindplaatsen':[], 'references':[], 'relatie':[]}
+    summaries = {}
+    in_summary = 0
+    # Per open element below the root: [element, text of its finished children, last finished child]
+    stack = []
+    depth = 0
+    children = 0
+
+    for event, elem in et.iterparse(doc, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                continue
+            if stack:
+                # The tail of the previous sibling is complete now: keep it and drop the sibling from the tree
+                parent, parts, last = stack[-1]
+                if last is not None:
+                    parts.append(last.tail or '')
+                    stack[-1][2] = None
+                    # A summary is kept whole until its end, where its own text is taken from the tree
+                    if not in_summary and len(parent) and parent[0] is last:
+                        del parent[0]
+            stack.append([elem, [], None])
+            # Remember matching elements in document order; their text is only complete at the 'end' event
+            tag = elem.tag
+            if tag in first_tags:
+                if first_tags[tag] not in found:
+                    found.add(first_tags[tag])
+                    pending.append((first_tags[tag], elem))
+            elif tag in list_tags:
+                pending.append((list_tags[tag], elem))
+            elif tag == namespaces['inhoudsindicatie']:
+                pending.append(('inhoudsindicatie', elem))
+                in_summary += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                continue
+            # The text of the element in itertext() order; its children are not needed any more
+            _, parts, last = stack.pop()
+            if last is not None:
+                parts.append(last.tail or '')
+            content = (elem.text or '') + ''.join(parts)
+            if elem.tag == namespaces['inhoudsindicatie']:
+                # With line breaks around its blocks, as in parse; content itself stays as itertext has it
+                summaries[elem] = summary_text(elem)
+                in_summary -= 1
+            if not in_summary:
+                del elem[:]
+            if depth != 1:
+                # The parent still needs the tail of this element, which is only complete at the next event
+                stack[-1][1].append(content)
+                stack[-1][2] = elem
+                continue
+            # A child of the root element is complete: read out what we need, then free it
+            for key, match in pending:
+                if key in lists:
+                    lists[key].append(match.text)
+                elif key == 'inhoudsindicatie':
+                    meta['inhoudsindicatie'] = clean_summary(summaries[match])
+                else:
+                    meta[key] = match.text
+            pending = []
+            summaries = {}
+            if children == 2:
+                text['tekst'] = content
+            children += 1
+            elem.clear()
+
+    for x in first_tags.values():
+        if x not in found:
+            meta[x] = "Not found"
+
+    meta['rechtsgebied'] = lists['rechtsgebied']
+    meta['vindplaatsen'] = lists['vindplaatsen']
+    meta['relaties'] = lists['references'] + lists['relatie']
+    meta['commentaren'] = len(meta['vindplaatsen'])
+
+    if 'tekst' not in text:
+        text['tekst'] = ""
+
+    return(meta,text)
+
 
 
 # %%
@@ -191,66 +349,357 @@ def appendcsv(zaken_rich, haystack, year):
 
 
 # %%
-def rework(year):
-    filename = "caseinfo_"+year +".csv"
-    textfilename = "casetext_"+year+".csv"
-    
-    df1['procedure'] = df1['procedure'].str.replace("Not found","Geen informatie")
+# Besides CSV, the parser can write Parquet (needs pyarrow). Every column is stored as text, the way it reads in
+# the CSVs, except for the counts in int_cols. Parquet files are written in row groups, one per flush
+
+output_format = 'csv'
+int_cols = ('filesize', 'commentaren', 'Unnamed: 0')
+
+def arrow_table(df):
+    if pa is None:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+    arrays = []
+    for c in df.columns:
+        if c in int_cols:
+            arrays.append(pa.array(pd.to_numeric(df[c], errors='coerce'), type=pa.int64(), from_pandas=True))
+        else:
+            arrays.append(pa.array([None if v is None or v != v else str(v) for v in df[c]], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
 
-    # Add the 'jurisprudentie' column
-    df1['Bron'] = 'Jurisprudentie'
+# CSV_TO_PARQUET converts an existing pipe-separated CSV (e.g. caseinfopush_<year>.csv) to Parquet in chunks
 
-    #kill some columns
-    df1.drop(["publisher","bereik","rechtsgebied","vervangt","relaties","commentaren","Source","Raw"],axis=1,inplace=True)
-    df1['titel'][df1['procedure']=="Geen informatie"] = df1['id'] + ": zaak " + df1['zaaknummer'] +" van " + df1['datum'] + " bij de " + df1['instantie']
-    df1['titel'][df1['procedure']!="Geen informatie"] = df1['id'] + ": zaak " + df1['zaaknummer'] +" van " + df1['datum'] + " bij de " + df1['instantie'] +". " + df1['procedure']
+def csv_to_parquet(filename, outfile=None, chunksize=50000):
+    outfile = outfile or filename[:-4] + ".parquet"
+    writer = None
+    try:
+        for df in pd.read_csv(filename, sep='|', dtype=str, chunksize=chunksize):
+            table = arrow_table(df)
+            if writer is None:
+                writer = pq.ParquetWriter(outfile, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return outfile
 
-    # Add the text as the final column
-    
-    df1['text'] = df2['tekst'].to_numpy()
-
-    df1.drop_duplicates(inplace=True)
-    df1 = df1[df1['text'].notna()]
-    outfile = "caseinfopush_"+year+".csv"
-    print("Prepared updated df file")
-    df1.to_csv(outfile,mode='w+', header=True, encoding="utf-8",sep='|')
-    print("Wrote updated df file")
-    del df1
-    del df2
-    print("Dropped old df")
-    
-    
 
 # %%
-errs=[]
-# enter the folder where you store the OpenDataUitspraken file
-path_source_eclis = ''
-dirs = os.listdir(path_source_eclis)
-for i in dirs[16:]:
-    subdirs = os.listdir(path_source_eclis+"\\"+i)
-    for k in subdirs:
-        #print(k)
+# CASEWRITER buffers parsed cases in memory and appends them to the year's CSVs in bulk, instead of opening both
+# files for every single case like APPENDCSV. The output is the same: caseinfo gets a header only if the file is
+# new, casetext never gets one. With fmt='parquet' it writes caseinfo_<year>.parquet and casetext_<year>.parquet
+# instead. Use it as a context manager so the buffer is flushed (and Parquet files closed) on exit or on an exception.
+# on_flush(members, rows) is called for cases once they are on disk: for CSV after every flush, for Parquet only
+# when close() has swapped the finished files in
+
+flush_rows = 5000
+flush_bytes = 64 * 2**20
+
+class CaseWriter:
+
+    def __init__(self, year, max_rows=None, max_bytes=None, fmt=None, on_flush=None):
+        self.fmt = fmt or output_format
+        ext = ".parquet" if self.fmt == 'parquet' else ".csv"
+        self.filename = "caseinfo_"+year +ext
+        self.textfilename = "casetext_"+year+ext
+        self.max_rows = max_rows or flush_rows
+        self.max_bytes = max_bytes or flush_bytes
+        self.header = not os.path.isfile(self.filename)
+        self.parquet_writers = None
+        self.on_flush = on_flush
+        # Parquet rows flushed to the .tmp files, not yet reported: (members, rows)
+        self.unreported = ([], [])
+        self.rows = []
+        self.texts = []
+        self.members = []
+        self.size = 0
+        self.written = 0
+
+    def add(self, meta, tekst, member=None):
+        self.rows.append(meta)
+        self.texts.append(tekst)
+        self.members.append(member)
+        # Rough size of the buffer: the case text dominates, the summary comes second
+        self.size += len(tekst or "") + len(meta['inhoudsindicatie'] or "")
+        if len(self.rows) >= self.max_rows or self.size >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        zaken_rich_out = pd.DataFrame(self.rows)
+        zaken_rich_out.rename(columns={zaken_rich_out.columns[0]:'id'},inplace=True)
+        haystack_out = pd.DataFrame({'tekst': self.texts})
+
+        if self.fmt == 'parquet':
+            self.write_parquet(zaken_rich_out, haystack_out)
+            # Only in the .tmp files so far: reported when close() swaps them in
+            self.unreported[0].extend(self.members)
+            self.unreported[1].extend(self.rows)
+        else:
+            zaken_rich_out.to_csv(self.filename, mode='a', header=self.header, encoding="utf-8",sep='|',index=False)
+            self.header = False
+            haystack_out.to_csv(self.textfilename, mode='a', header=False, encoding="utf-8",sep='|',index=False)
+            # Only report the cases as written once they are on disk
+            if self.on_flush is not None:
+                self.on_flush(self.members, self.rows)
+
+        self.written += len(self.rows)
+        self.rows = []
+        self.texts = []
+        self.members = []
+        self.size = 0
+
+    def write_parquet(self, zaken_rich_out, haystack_out):
+        info = arrow_table(zaken_rich_out)
+        text = arrow_table(haystack_out)
+        if self.parquet_writers is None:
+            self.parquet_writers = (self.open_parquet(self.filename, info.schema), self.open_parquet(self.textfilename, text.schema))
+        self.parquet_writers[0].write_table(info)
+        self.parquet_writers[1].write_table(text)
+
+    def open_parquet(self, filename, schema):
+        # Parquet files can't be appended to: write a new file that starts with the existing row groups, and
+        # swap it in on close
+        writer = pq.ParquetWriter(filename + ".tmp", schema)
+        if os.path.isfile(filename):
+            pf = pq.ParquetFile(filename)
+            for i in range(pf.num_row_groups):
+                writer.write_table(pf.read_row_group(i))
+        return writer
+
+    def close(self):
         try:
-            z = zipfile.ZipFile(path_source_eclis+"\\"+i + "\\" + k)
-            for j in z.infolist():
-                if j.filename.endswith(".xml"):
-                    #print("Capturing information for:" + j.filename +", size is " + str(j.file_size))
-                    zaken_rich={}
-                    zaken_err={}
-                    haystack={}
-                    model_step1={}
-                    f = z.open(j)
-                    parsed = parse(f)
-                    temp_zaken = parsed[0]
-                    temp_zaken['filesize'] = j.file_size
-                    caseid = temp_zaken['identifier']
-                    if temp_zaken['identifier']:
-
-                        zaken_rich[caseid] = temp_zaken
-                        haystack[caseid] = parsed[1]['tekst']
-
-                    appendcsv(zaken_rich, haystack, i)
+            self.flush()
+        finally:
+            if self.parquet_writers is not None:
+                for w, filename in zip(self.parquet_writers, (self.filename, self.textfilename)):
+                    w.close()
+                    os.replace(filename + ".tmp", filename)
+                self.parquet_writers = None
+                # Both files are in place now, so a crash can no longer lose these cases
+                members, rows = self.unreported
+                self.unreported = ([], [])
+                if self.on_flush is not None and members:
+                    self.on_flush(members, rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+# %%
+# REWORK finalizes a year: it merges caseinfo_<year> and casetext_<year> into caseinfopush_<year>, the file the
+# loaders read. Both files are streamed side by side in aligned chunks of rework_chunksize rows, so memory does not
+# grow with a year. A case that was parsed more than once (because its zip member changed, see the skip index)
+# is kept in its latest version: a first pass over the id column finds the last row of every id
+
+rework_chunksize = 20000
+
+def read_aligned(year, fmt, chunksize):
+    if fmt == 'parquet':
+        # Both files get their row groups from the same CaseWriter flushes, so their batches line up
+        info = pq.ParquetFile("caseinfo_"+year+".parquet").iter_batches(batch_size=chunksize)
+        text = pq.ParquetFile("casetext_"+year+".parquet").iter_batches(batch_size=chunksize)
+        info = (b.to_pandas() for b in info)
+        text = (b.to_pandas() for b in text)
+    else:
+        info = pd.read_csv("caseinfo_"+year +".csv", sep='|', dtype=str, chunksize=chunksize)
+        text = pd.read_csv("casetext_"+year+".csv", sep='|', dtype=str, header=None, names=['tekst'], chunksize=chunksize)
+    for df1, df2 in zip(info, text):
+        if len(df1) != len(df2):
+            raise ValueError("caseinfo_"+year+" and casetext_"+year+" are not aligned")
+        yield df1, df2
+
+def last_rows(year, fmt, chunksize):
+    last = {}
+    if fmt == 'parquet':
+        ids = (b.column(0).to_pylist() for b in pq.ParquetFile("caseinfo_"+year+".parquet").iter_batches(batch_size=chunksize, columns=['id']))
+    else:
+        ids = (df['id'].tolist() for df in pd.read_csv("caseinfo_"+year +".csv", sep='|', dtype=str, usecols=['id'], chunksize=chunksize))
+    offset = 0
+    for chunk in ids:
+        for n, caseid in enumerate(chunk, offset):
+            last[caseid] = n
+        offset += len(chunk)
+    return last
+
+def rework(year, fmt=None, chunksize=None):
+    fmt = fmt or output_format
+    chunksize = chunksize or rework_chunksize
+    outfile = "caseinfopush_"+year+(".parquet" if fmt == 'parquet' else ".csv")
+
+    last = last_rows(year, fmt, chunksize)
+    offset = 0
+    written = 0
+    parquet_writer = None
+    try:
+        for df1, df2 in read_aligned(year, fmt, chunksize):
+            # Row numbers of the caseinfo file, which end up as the index column of the CSV
+            df1.index = range(offset, offset + len(df1))
+            offset += len(df1)
+
+            df1['procedure'] = df1['procedure'].str.replace("Not found","Geen informatie")
+
+            # Add the 'jurisprudentie' column
+            df1['Bron'] = 'Jurisprudentie'
+
+            #kill some columns
+            df1 = df1.drop(["publisher","bereik","rechtsgebied","vervangt","relaties","commentaren","Source","Raw"],axis=1,errors='ignore')
+            titel = df1['id'] + ": zaak " + df1['zaaknummer'] +" van " + df1['datum'] + " bij de " + df1['instantie']
+            df1['titel'] = titel.where(df1['procedure']=="Geen informatie", titel +". " + df1['procedure'])
+
+            # Add the text as the final column
+            df1['text'] = df2['tekst'].to_numpy()
+
+            # Keep the latest version of every case, if it has text (empty text reads back as NaN from CSV, not
+            # from Parquet)
+            df1 = df1[df1['id'].map(last) == df1.index]
+            df1 = df1[df1['text'].fillna("") != ""]
+
+            if fmt == 'parquet':
+                table = arrow_table(df1)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(outfile, table.schema)
+                parquet_writer.write_table(table)
+            else:
+                df1.to_csv(outfile, mode='w+' if written == 0 else 'a', header=written == 0, encoding="utf-8",sep='|')
+            written += len(df1)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    print("Wrote " + outfile + ": " + str(written) + " of " + str(offset) + " cases")
+    return written
+
+
+# %%
+# PARSE_MEMBERS parses a chunk of XML members from one zip. It runs in a worker process and returns the parsed
+# cases in member order, plus the errors it ran into
+
+def parse_members(zip_path, names):
+    rows = []
+    errors = []
+    with zipfile.ZipFile(zip_path) as z:
+        for name in names:
+            try:
+                j = z.getinfo(name)
+                with z.open(j) as f:
+                    large = stream_size is not None and j.file_size > stream_size
+                    parsed = parse_stream(f) if large else parse(f)
+                temp_zaken = parsed[0]
+                temp_zaken['filesize'] = j.file_size
+                rows.append((name, temp_zaken, parsed[1]['tekst']))
+            except Exception as e:
+                errors.append(zip_path + " / " + name + ": " + repr(e))
+    return(rows, errors)
+
+
+# %%
+# The skip index is a small SQLite database with a row for every zip member that has been parsed: the CRC and
+# size from the zip directory, the ECLI it contained and the file the case was written to. Re-runs only parse
+# members that are new or whose CRC or size changed
+
+index_db = "parsed_members.sqlite"
+
+class SkipIndex:
+
+    def __init__(self, path=None):
+        self.con = sqlite3.connect(path or index_db)
+        self.con.execute("CREATE TABLE IF NOT EXISTS members (zip TEXT, member TEXT, crc INTEGER, size INTEGER, "
+                         "identifier TEXT, output TEXT, PRIMARY KEY (zip, member))")
+
+    def known(self, zip_key):
+        return {m: (crc, size) for m, crc, size in self.con.execute("SELECT member, crc, size FROM members WHERE zip = ?", (zip_key,))}
+
+    def record(self, entries):
+        # entries: (zip, member, crc, size, identifier, output)
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO members VALUES (?, ?, ?, ?, ?, ?)", entries)
+
+    def close(self):
+        self.con.close()
+
+
+# %%
+# INGEST_YEAR parses the new and changed members of all zips in one year directory on the worker pool, writes the
+# cases to the year's CSVs and records them in the skip index. Returns the number of cases written and the errors
+
+def ingest_year(year_dir, year, executor, index):
+    errs = []
+    members = {}
+
+    def tasks():
+        for k in sorted(os.listdir(year_dir)):
+            zip_path = os.path.join(year_dir, k)
+            zip_key = year + "/" + k
+            try:
+                with zipfile.ZipFile(zip_path) as z:
+                    infos = [j for j in z.infolist() if j.filename.endswith(".xml")]
+            except Exception as e:
+                print(e)
+                errs.append(zip_path + ": " + repr(e))
+                continue
+            known = index.known(zip_key)
+            names = []
+            for j in infos:
+                if known.get(j.filename) != (j.CRC, j.file_size):
+                    members[(zip_path, j.filename)] = (zip_key, j.filename, j.CRC, j.file_size)
+                    names.append(j.filename)
+            if len(names) < len(infos):
+                print(zip_key + ": skipping " + str(len(infos) - len(names)) + " unchanged members")
+            for n in range(0, len(names), chunk_size):
+                yield zip_path, names[n:n + chunk_size]
+
+    def recorded(keys, rows):
+        index.record([members.pop(k) + (meta['identifier'], writer.filename) for k, meta in zip(keys, rows)])
+
+    def write(zip_path, future):
+        try:
+            rows, errors = future.result()
         except Exception as e:
             print(e)
-            errs.append(e)
-    rework(i)
+            errs.append(repr(e))
+            return
+        empty = []
+        for name, temp_zaken, tekst in rows:
+            if temp_zaken['identifier']:
+                writer.add(temp_zaken, tekst, (zip_path, name))
+            else:
+                empty.append(members.pop((zip_path, name)) + ('', ''))
+        index.record(empty)
+        for e in errors:
+            print(e)
+        errs.extend(errors)
+
+    # Keep a bounded window of tasks in flight, so finished chunks never pile up in memory ahead of the writer
+    window = deque()
+    with CaseWriter(year, on_flush=recorded) as writer:
+        for zip_path, names in tasks():
+            window.append((zip_path, executor.submit(parse_members, zip_path, names)))
+            if len(window) >= 2 * n_workers:
+                write(*window.popleft())
+        while window:
+            write(*window.popleft())
+
+    return writer.written, errs
+
+
+# %%
+if __name__ == "__main__":
+    errs=[]
+    # enter the folder where you store the OpenDataUitspraken file
+    path_source_eclis = ''
+    dirs = sorted(i for i in os.listdir(path_source_eclis) if os.path.isdir(os.path.join(path_source_eclis, i)))
+    index = SkipIndex()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for i in dirs:
+            written, year_errs = ingest_year(os.path.join(path_source_eclis, i), i, executor, index)
+            errs.extend(year_errs)
+            # Only finalize years that changed
+            ext = ".parquet" if output_format == 'parquet' else ".csv"
+            if written or (os.path.isfile("caseinfo_"+i+ext) and not os.path.isfile("caseinfopush_"+i+ext)):
+                rework(i)
+    index.close()
@@ -0,0 +1,40 @@
+# When parser.CaseWriter reports cases as written: the skip index records them from on_flush, so a case must be
+# on disk before it is reported.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import parser
+
+
+def case(ecli):
+    return dict(parser.new_meta(), identifier=ecli, inhoudsindicatie="Samenvatting.")
+
+
+def test_csv_reports_every_flush(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reported = []
+    with parser.CaseWriter('2020', max_rows=1, fmt='csv', on_flush=lambda members, rows: reported.extend(members)) as writer:
+        writer.add(case('ECLI:1'), "tekst", ('a.zip', '1.xml'))
+        assert reported == [('a.zip', '1.xml')]
+
+
+def test_parquet_reports_after_close(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.chdir(tmp_path)
+    reported = []
+    writer = parser.CaseWriter('2020', max_rows=1, fmt='parquet', on_flush=lambda members, rows: reported.extend(members))
+    writer.add(case('ECLI:1'), "tekst", ('a.zip', '1.xml'))
+    writer.add(case('ECLI:2'), "tekst", ('a.zip', '2.xml'))
+    # Flushed, but only to the .tmp files that a crash would leave behind
+    assert reported == []
+    assert not os.path.exists('caseinfo_2020.parquet')
+    writer.close()
+    assert reported == [('a.zip', '1.xml'), ('a.zip', '2.xml')]
+    assert os.path.exists('caseinfo_2020.parquet') and not os.path.exists('caseinfo_2020.parquet.tmp')
@@ -0,0 +1,44 @@
+# Failed chunks in Wetzoek_GPUbackend/checkpoint.Checkpoint: a chunk stays failed until it has completed every
+# stage, whatever it marked after the error.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Wetzoek_GPUbackend'))
+
+from checkpoint import Checkpoint, stages
+
+
+def test_error_before_later_stages_is_reported(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "manifest.db"))
+    key = ("a.csv", 100, 0)
+    checkpoint.mark(key, 'preprocessed')
+    checkpoint.fail(key, "embedding failed")
+    checkpoint.mark(key, 'splitdoc')
+    checkpoint.mark(key, 'document')
+    assert checkpoint.failed() == {key: "embedding failed"}
+    checkpoint.close()
+
+
+def test_finished_chunk_is_not_reported(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "manifest.db"))
+    key = ("a.csv", 100, 0)
+    checkpoint.fail(key, "first try")
+    for stage in stages:
+        checkpoint.mark(key, stage)
+    assert checkpoint.failed() == {}
+    checkpoint.unmark(key, 'splitdoc')
+    assert checkpoint.failed() == {key: "first try"}
+    checkpoint.close()
+
+
+def test_last_error_and_file_filter(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "manifest.db"))
+    checkpoint.fail(("a.csv", 100, 0), "first")
+    checkpoint.fail(("a.csv", 100, 0), "second")
+    checkpoint.fail(("b.csv", 100, 3), "other file")
+    assert checkpoint.failed("a.csv") == {("a.csv", 100, 0): "second"}
+    assert set(checkpoint.failed()) == {("a.csv", 100, 0), ("b.csv", 100, 3)}
+    checkpoint.close()
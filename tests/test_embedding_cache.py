@@ -0,0 +1,70 @@
+# Round-trips through Wetzoek_GPUbackend/embedding_cache.EmbeddingCache, also with more than one process on the
+# same cache directory.
+#
+#   python -m pytest tests
+
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Wetzoek_GPUbackend'))
+
+from embedding_cache import EmbeddingCache
+
+
+def vector(text):
+    return np.full(8, float(sum(map(ord, text))), dtype=np.float32)
+
+
+def test_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), grow=4)
+    texts = ["passage %d" % i for i in range(10)]
+    cache.put('m', texts, [vector(t) for t in texts])
+    assert all(np.array_equal(e, vector(t)) for t, e in zip(texts, cache.get('m', texts)))
+    # Another model, a text that was never put and an embedding that is None are all misses
+    assert cache.get('other', texts[:1]) == [None]
+    assert cache.get('m', ["new"]) == [None]
+    cache.put('m', ["failed"], [None])
+    assert cache.get('m', ["failed"]) == [None]
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path))
+    assert np.array_equal(reopened.get('m', texts[-1:])[0], vector(texts[-1]))
+
+
+def test_two_instances(tmp_path):
+    # Both opened before either wrote: they must not hand out the same row
+    a = EmbeddingCache(str(tmp_path), grow=2)
+    b = EmbeddingCache(str(tmp_path), grow=2)
+    a.put('m', ['x'], [vector('x')])
+    b.put('m', ['y'], [vector('y')])
+    for cache in (a, b):
+        x, y = cache.get('m', ['x', 'y'])
+        assert np.array_equal(x, vector('x')) and np.array_equal(y, vector('y'))
+    # Rows b added past the end of a's map
+    texts = ["t%d" % i for i in range(20)]
+    b.put('m', texts, [vector(t) for t in texts])
+    assert np.array_equal(a.get('m', texts[-1:])[0], vector(texts[-1]))
+
+
+def fill(directory, worker):
+    cache = EmbeddingCache(directory, grow=8)
+    for i in range(0, 100, 5):
+        texts = ["w%d-%d" % (worker, j) for j in range(i, i + 5)]
+        cache.put('m', texts, [vector(t) for t in texts])
+    cache.close()
+
+
+def test_processes(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=fill, args=(str(tmp_path), w)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+        assert p.exitcode == 0
+    texts = ["w%d-%d" % (w, j) for w in range(4) for j in range(100)]
+    cache = EmbeddingCache(str(tmp_path))
+    assert all(e is not None and np.array_equal(e, vector(t)) for t, e in zip(texts, cache.get('m', texts)))
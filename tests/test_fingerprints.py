@@ -0,0 +1,53 @@
+# Change detection of Wetzoek_GPUbackend/fingerprints.py: which fetched cases the daily updater skips, only
+# updates the metadata of, or indexes again.
+#
+#   python -m pytest tests
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Wetzoek_GPUbackend'))
+
+import fingerprints
+from fingerprints import Fingerprints, change, fingerprint
+
+
+def case(text="De rechtbank wijst de vordering af.", **meta):
+    # fingerprint only reads the content and meta of the Documents of a case
+    meta = dict({'id': "ECLI:NL:RBAMS:2022:1", 'instantie': "Rechtbank Amsterdam", 'added': "2022-09-09",
+                 'issued': "2022-03-01"}, **meta)
+    return [SimpleNamespace(content=text, meta=meta), SimpleNamespace(content="Samenvatting.", meta=dict(meta))]
+
+
+def test_change():
+    old = fingerprint(case())
+    assert change(None, old) == 'new'
+    assert change(old, fingerprint(case())) == 'unchanged'
+    assert change(old, fingerprint(case(instantie="Hoge Raad"))) == 'meta'
+    assert change(old, fingerprint(case(text="De rechtbank wijst de vordering toe."))) == 'text'
+    assert change(old, fingerprint(case(text="Nieuw.", instantie="Hoge Raad"))) == 'text'
+
+
+def test_volatile_meta_ignored():
+    old = fingerprint(case())
+    for field in fingerprints.volatile:
+        assert change(old, fingerprint(case(**{field: "2023-01-01"}))) == 'unchanged'
+
+
+def test_meta_key_order_ignored():
+    docs = case()
+    reordered = [SimpleNamespace(content=doc.content, meta=dict(reversed(list(doc.meta.items())))) for doc in docs]
+    assert fingerprint(reordered) == fingerprint(docs)
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "fingerprints.db")
+    store = Fingerprints(path)
+    assert store.get("ECLI:NL:RBAMS:2022:1") is None
+    store.put([("ECLI:NL:RBAMS:2022:1", fingerprint(case()), "2022-09-09")])
+    store.put([("ECLI:NL:RBAMS:2022:1", fingerprint(case(instantie="Hoge Raad")), "2022-09-10")])
+    store.close()
+    store = Fingerprints(path)
+    assert store.get("ECLI:NL:RBAMS:2022:1") == fingerprint(case(instantie="Hoge Raad"))
+    store.close()
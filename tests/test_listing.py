@@ -0,0 +1,73 @@
+# Paging through the listing of a day with Wetzoek_GPUbackend/listing.Listing, on the stub server of
+# benchmarks/bench_fetch.py, also when pages are answered with a 503 or break off halfway and have to be retried.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+import httpx
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', 'Wetzoek_GPUbackend'))
+sys.path.insert(0, os.path.join(here, '..', 'benchmarks'))
+
+import fetcher
+import listing
+from bench_fetch import stub_server
+
+day = "2022-03-01"
+ids = ["ECLI:NL:RBAMS:2022:%d" % n for n in range(23)]
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(fetcher, 'rate', None)
+    monkeypatch.setattr(fetcher, 'backoff', 0.001)
+    monkeypatch.setattr(listing, 'page_size', 5)
+    servers = []
+
+    def serve(**kwargs):
+        server = stub_server({}, latency=0, listings={day: ids}, **kwargs)
+        servers.append(server)
+        return "http://127.0.0.1:%d/uitspraken/zoeken" % server.server_address[1], server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+def test_pages(serve):
+    url, server = serve(flaky=0)
+    day_listing = listing.Listing(day, url=url)
+    assert list(day_listing) == ids
+    assert day_listing.found == len(ids)
+    assert day_listing.count == len(ids)
+
+
+def test_last_page_full(serve, monkeypatch):
+    monkeypatch.setattr(listing, 'page_size', 23)
+    url, server = serve(flaky=0)
+    assert list(listing.Listing(day, url=url)) == ids
+    assert list(listing.Listing("2022-03-02", url=url)) == []
+
+
+def test_retry_after_503(serve):
+    url, server = serve(flaky=0.3, seed=1)
+    assert list(listing.Listing(day, url=url)) == ids
+
+
+def test_resume_after_broken_page(serve):
+    url, server = serve(flaky=0, cut=0.5, seed=1)
+    day_listing = listing.Listing(day, url=url)
+    assert list(day_listing) == ids
+    assert server.cut > 0
+    assert day_listing.count == len(ids)
+
+
+def test_gives_up_after_retries(serve, monkeypatch):
+    monkeypatch.setattr(fetcher, 'retries', 1)
+    url, server = serve(flaky=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        list(listing.Listing(day, url=url))
@@ -0,0 +1,22 @@
+# haystack_load.py and Wetzoek_GPUbackend/gpubuild.py each have a copy of read_frames. Both need Haystack to
+# import, so the copies are compared as source.
+#
+#   python -m pytest tests
+
+import ast
+import os
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def function(path, name):
+    with open(os.path.join(root, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            return ast.dump(node)
+    raise AssertionError(name + " not found in " + path)
+
+
+def test_read_frames_copies_are_the_same():
+    assert function("haystack_load.py", "read_frames") == function(os.path.join("Wetzoek_GPUbackend", "gpubuild.py"), "read_frames")
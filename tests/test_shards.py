@@ -0,0 +1,76 @@
+# Day shards of Wetzoek_GPUbackend/shards.py: reading cases back, and chunk ids (frame_id) that stay the same
+# on a rerun and change for the chunks whose lines change when a case is appended again.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Wetzoek_GPUbackend'))
+
+import shards
+
+
+def case(n, text="tekst"):
+    return {'id': "ECLI:NL:HR:2022:%d" % n, 'tekst': text, 'subject': ["Civiel recht"]}
+
+
+def write(directory, records):
+    with shards.ShardWriter(str(directory), flush_every=2) as writer:
+        for record in records:
+            writer.append(record)
+
+
+def ids(directory, chunksize=2):
+    return [shards.frame_id(df) for df in shards.read_frames(str(directory), chunksize)]
+
+
+def test_read_case_and_lines(tmp_path):
+    write(tmp_path, [case(n) for n in range(3)])
+    assert shards.read_case(str(tmp_path), "ECLI:NL:HR:2022:1") == case(1)
+    assert shards.read_case(str(tmp_path), "ECLI:NL:HR:2022:9") is None
+    lines = list(shards.read_lines(str(tmp_path)))
+    assert [record for _, record in lines] == [case(n) for n in range(3)]
+    with open(tmp_path / shards.shard_name, "rb") as f:
+        for offset, record in lines:
+            f.seek(offset)
+            assert shards.read_case(str(tmp_path), record['id']) == record
+            assert f.readline().startswith(b'{"id": "%s"' % record['id'].encode())
+
+
+def test_appended_again_reads_last_version(tmp_path):
+    write(tmp_path, [case(n) for n in range(3)])
+    write(tmp_path, [case(1, "nieuwe tekst")])
+    records = list(shards.read_records(str(tmp_path)))
+    assert [r['id'] for r in records] == ["ECLI:NL:HR:2022:0", "ECLI:NL:HR:2022:2", "ECLI:NL:HR:2022:1"]
+    assert records[-1]['tekst'] == "nieuwe tekst"
+    assert shards.read_case(str(tmp_path), "ECLI:NL:HR:2022:1")['tekst'] == "nieuwe tekst"
+
+
+def test_rebuild_index(tmp_path):
+    write(tmp_path, [case(n) for n in range(3)])
+    write(tmp_path, [case(1, "nieuwe tekst")])
+    index = shards.load_index(str(tmp_path))
+    os.remove(tmp_path / shards.index_name)
+    shards.rebuild_index(str(tmp_path))
+    assert shards.load_index(str(tmp_path)) == index
+
+
+def test_frame_id_stable_on_rerun(tmp_path):
+    write(tmp_path, [case(n) for n in range(5)])
+    first = ids(tmp_path)
+    assert len(first) == 3 and len(set(first)) == 3
+    assert ids(tmp_path) == first
+
+
+def test_frame_id_changes_with_appended_case(tmp_path):
+    write(tmp_path, [case(n) for n in range(6)])
+    before = ids(tmp_path)
+    write(tmp_path, [case(3, "nieuwe tekst")])
+    after = ids(tmp_path)
+    # Lines 0-1 are untouched; the chunk that held case 3 and every chunk after it holds other lines now
+    assert after[0] == before[0]
+    assert not set(after[1:]) & set(before)
+    frames = list(shards.read_frames(str(tmp_path), 2))
+    assert frames[-1]['tekst'].iloc[-1] == "nieuwe tekst"
+    assert frames[-1]['subject'].iloc[-1] == "['Civiel recht']"
@@ -0,0 +1,67 @@
+# What parser.clean_summary and the two parsers make of the inhoudsindicatie of a case.
+#
+#   python -m pytest tests
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import parser
+
+fixtures = [
+    ("\n      Ontslag op staande voet.\n      Dringende reden aanwezig.\n    ",
+     "Ontslag op staande voet. Dringende reden aanwezig."),
+    ("Art. 7:677 BW; geen billijke vergoeding.", "Art. 7:677 BW; geen billijke vergoeding."),
+    ("Kennelijk onredelijke huur­prijs​.", "Kennelijk onredelijke huurprijs."),
+    ("Verweerder heeft <br/>het besluit <emphasis role=\"bold\">niet</emphasis> deugdelijk gemotiveerd .",
+     "Verweerder heeft het besluit niet deugdelijk gemotiveerd."),
+    ("Rente < 5% en termijn > 3 jaar (art. 6:119 BW )", "Rente < 5% en termijn > 3 jaar (art. 6:119 BW)"),
+    ("", ""),
+    ("\n\n   \t", ""),
+]
+
+case = b'''<open-rechtspraak>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"><rdf:Description/></rdf:RDF>
+<inhoudsindicatie xmlns="http://www.rechtspraak.nl/schema/rechtspraak-1.0"><para>Geen dringende reden voor ontslag op staande voet, de werkgever wist er al van.</para><para>Aan de werknemer komt een <emphasis>billijke</emphasis> vergoeding toe.</para></inhoudsindicatie>
+<uitspraak xmlns="http://www.rechtspraak.nl/schema/rechtspraak-1.0"><section><title>Procesverloop</title><para>De kantonrechter oordeelt.</para></section></uitspraak>
+</open-rechtspraak>'''
+
+summary = ("Geen dringende reden voor ontslag op staande voet, de werkgever wist er al van. "
+           "Aan de werknemer komt een billijke vergoeding toe.")
+
+
+@pytest.mark.parametrize("raw, expected", fixtures)
+def test_clean_summary(raw, expected):
+    assert parser.clean_summary(raw) == expected
+
+
+@pytest.mark.parametrize("parse", [parser.parse, parser.parse_stream])
+def test_paragraphs_are_separated(parse):
+    meta, text = parse(io.BytesIO(case))
+    assert meta['inhoudsindicatie'] == summary
+    # The ruling is left as itertext returns it
+    assert text['tekst'] == "ProcesverloopDe kantonrechter oordeelt."
+
+
+def test_parsers_agree():
+    assert parser.parse(io.BytesIO(case)) == parser.parse_stream(io.BytesIO(case))
+
+
+summary_block = (b'<inhoudsindicatie xmlns="http://www.rechtspraak.nl/schema/rechtspraak-1.0">'
+                 b'<para>Een.</para><para>Twee.</para></inhoudsindicatie>')
+
+
+@pytest.mark.parametrize("doc", [
+    # The summary as the third child of the root, where parse takes the ruling from
+    case.replace(b'<rdf:RDF', summary_block + b'\n<rdf:RDF', 1),
+    # A summary inside the ruling
+    case.replace(b'<section>', b'<section>' + summary_block, 1),
+], ids=["third child of the root", "inside the ruling"])
+def test_summary_breaks_stay_out_of_the_ruling(doc):
+    tree = parser.parse(io.BytesIO(doc))
+    assert parser.parse_stream(io.BytesIO(doc)) == tree
+    assert "\n" not in tree[1]['tekst']